@@ -0,0 +1,333 @@
+"""
+FlowMate Engine Benchmarks
+Reproducible throughput/latency numbers for the engine's hot paths.
+
+Generates a synthetic inbox and a local stand-in HTTP server, then times
+email_monitor scans, batched multi-flow matching, data_pull fetches and
+end-to-end /execute requests. Per-stage timings come from engine.metrics.
+
+    python bench.py --files 1000,10000 --runs 20
+    python bench.py --files 1000000 --sizes mixed --skip-http --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+import engine
+
+
+# ------------------------------
+# Helpers
+# ------------------------------
+
+SENDERS = ["alerts@company.com", "billing@vendor.io", "noreply@github.com", "boss@company.com", "news@site.org"]
+SUBJECTS = ["Server Down", "Invoice due", "New pull request", "Weekly digest", "Urgent: disk full", "Lunch?"]
+WORDS = "the flow is working fine please check server status urgent invoice deploy release build".split()
+
+# (probability, body size in bytes) for --sizes mixed
+MIXED_SIZES = [(0.80, 512), (0.15, 8 * 1024), (0.045, 256 * 1024), (0.005, 2 * 1024 * 1024)]
+
+
+def body_text(rng: random.Random, size: int) -> str:
+    words = []
+    total = 0
+    while total < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def make_inbox(folder: str, files: int, sizes: str, seed: int = 7) -> int:
+    """Write `files` synthetic emails (90% JSON, 10% text). Returns bytes written."""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    written = 0
+    base = time.time() - files
+    for i in range(files):
+        if sizes == "small":
+            size = 512
+        else:
+            roll, size = rng.random(), MIXED_SIZES[-1][1]
+            for p, s in MIXED_SIZES:
+                if roll < p:
+                    size = s
+                    break
+                roll -= p
+        body = body_text(rng, size)
+        if i % 10:
+            path = os.path.join(folder, f"msg{i:07d}.json")
+            data = json.dumps({"from": rng.choice(SENDERS), "subject": rng.choice(SUBJECTS), "body": body})
+        else:
+            path = os.path.join(folder, f"note{i:07d}.txt")
+            data = body
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.utime(path, (base + i, base + i))
+        written += len(data)
+    return written
+
+
+def log(message: str):
+    """Progress goes to stderr so --json output stays parseable."""
+    print(message, file=sys.stderr)
+
+
+def timed_runs(fn: Callable[[], Any], runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(name: str, samples_ms: List[float], ops_per_sample: int = 1) -> Dict[str, Any]:
+    ordered = sorted(samples_ms)
+    total_s = sum(samples_ms) / 1000
+    return {
+        "case": name,
+        "samples": len(samples_ms),
+        "meanMs": round(statistics.fmean(samples_ms), 3),
+        "p50Ms": round(ordered[len(ordered) // 2], 3),
+        "p95Ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "opsPerSec": round(len(samples_ms) * ops_per_sample / total_s, 1) if total_s else None,
+    }
+
+
+# ------------------------------
+# Stand-in HTTP server for data_pull
+# ------------------------------
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves /small and /large JSON documents with ETag revalidation."""
+
+    protocol_version = "HTTP/1.1"
+    documents: Dict[str, bytes] = {}
+
+    def do_GET(self):  # noqa
+        body = self.documents.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = f'"{len(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming extraction closes the connection once it has its values.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_stand_in() -> StandInServer:
+    StandInHandler.documents = {
+        "/small": json.dumps({"full_name": "nodejs/node", "stargazers_count": 100000,
+                              "owner": {"login": "nodejs"}}).encode("utf-8"),
+        "/large": json.dumps({"meta": {"count": 50000},
+                              "items": [{"id": i, "name": f"item-{i}", "pad": "x" * 100}
+                                        for i in range(50000)]}).encode("utf-8"),
+    }
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ------------------------------
+# Cases
+# ------------------------------
+
+def bench_inbox(files: int, sizes: str, runs: int, workdir: str) -> List[Dict[str, Any]]:
+    folder = os.path.join(workdir, f"inbox-{files}")
+    started = time.perf_counter()
+    written = make_inbox(folder, files, sizes)
+    log(f"  generated {files} files ({written / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    executor = engine.WorkflowExecutor()
+    monitor = {"name": "bench", "type": "email_monitor", "config": {"folder": folder, "matchFrom": "alerts"}}
+    cold = timed_runs(lambda: executor.execute(monitor), 1)
+    results.append(summarize(f"email_monitor cold ({files} files)", cold, files))
+
+    warm = timed_runs(lambda: executor.execute(monitor), runs)
+    results.append(summarize(f"email_monitor warm ({files} files)", warm))
+
+    touched = max(1, files // 100)
+
+    def touch_and_scan():
+        for i in random.sample(range(files), touched):
+            name = f"msg{i:07d}.json" if i % 10 else f"note{i:07d}.txt"
+            os.utime(os.path.join(folder, name))
+        executor.execute(monitor)
+
+    results.append(summarize(f"email_monitor 1% changed ({files} files)", timed_runs(touch_and_scan, runs)))
+
+    flows = [
+        {"name": f"flow-{i}", "type": "email_monitor",
+         "config": {"folder": folder, "matchFrom": SENDERS[i % len(SENDERS)].split("@")[0],
+                    "matchSubject": SUBJECTS[i % len(SUBJECTS)].split()[0]}}
+        for i in range(50)
+    ]
+    batch = timed_runs(lambda: executor.execute_many(flows), runs)
+    results.append(summarize(f"execute_many 50 flows ({files} files)", batch, len(flows)))
+    shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def bench_fetch(requests_total: int, concurrency: int) -> List[Dict[str, Any]]:
+    stand_in = start_stand_in()
+    base = f"http://127.0.0.1:{stand_in.server_address[1]}"
+    results = []
+    try:
+        for label, ttl, path, json_path in [
+            ("data_pull cached", 30, "/small", "owner.login"),
+            ("data_pull revalidated (ttl=0)", 0, "/small", "owner.login"),
+            ("data_pull large streamed", 30, "/large", "meta.count"),
+        ]:
+            integrations = engine.RealIntegrations()
+            integrations.fetcher.ttl = ttl
+
+            def one():
+                started = time.perf_counter()
+                integrations.pull_notification_data(base + path, json_path)
+                return (time.perf_counter() - started) * 1000
+
+            count = requests_total if path == "/small" else max(1, requests_total // 20)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(lambda _: one(), range(count)))
+            elapsed = time.perf_counter() - started
+            row = summarize(f"{label} x{concurrency}", samples)
+            row["opsPerSec"] = round(count / elapsed, 1)
+            row["fetcher"] = integrations.fetcher.stats()
+            results.append(row)
+    finally:
+        stand_in.shutdown()
+    return results
+
+
+class QuietHandler(engine.Handler):
+    def log_message(self, format, *args):  # noqa
+        pass
+
+
+def bench_http(requests_total: int, concurrency: int, workdir: str) -> List[Dict[str, Any]]:
+    folder = os.path.join(workdir, "inbox-http")
+    make_inbox(folder, 1000, "small")
+    server = engine.EngineServer(("127.0.0.1", 0), QuietHandler, workers=concurrency,
+                                 queue_size=concurrency * 4)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    body = json.dumps({"flow": {"name": "bench", "type": "email_monitor",
+                                "config": {"folder": folder, "matchFrom": "alerts"}}})
+    per_client = max(1, requests_total // concurrency)
+
+    def client(_):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        samples = []
+        for _ in range(per_client):
+            started = time.perf_counter()
+            conn.request("POST", "/execute", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            samples.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        return samples
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = [s for chunk in pool.map(client, range(concurrency)) for s in chunk]
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+    row = summarize(f"POST /execute keep-alive x{concurrency}", samples)
+    row["opsPerSec"] = round(len(samples) / elapsed, 1)
+    return [row]
+
+
+# ------------------------------
+# Main
+# ------------------------------
+
+def print_table(rows: List[Dict[str, Any]]):
+    print(f"{'case':<48} {'n':>6} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>12}")
+    for row in rows:
+        print(f"{row['case']:<48} {row['samples']:>6} {row['meanMs']:>10} {row['p50Ms']:>10} "
+              f"{row['p95Ms']:>10} {row['opsPerSec'] if row['opsPerSec'] is not None else '-':>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FlowMate engine benchmarks")
+    parser.add_argument("--files", default="1000,10000", help="comma-separated inbox sizes")
+    parser.add_argument("--sizes", choices=("small", "mixed"), default="mixed", help="email body size mix")
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per inbox case")
+    parser.add_argument("--requests", type=int, default=400, help="requests per fetch/HTTP case")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--skip-http", action="store_true", help="skip data_pull and /execute cases")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    parser.add_argument("--workdir", default=None, help="where to generate inboxes (default: temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="flowmate-bench-")
+    rows: List[Dict[str, Any]] = []
+    try:
+        for files in (int(n) for n in args.files.split(",") if n.strip()):
+            log(f"inbox: {files} files, {args.sizes} sizes")
+            rows += bench_inbox(files, args.sizes, args.runs, workdir)
+        if not args.skip_http:
+            log("data_pull against local stand-in server")
+            rows += bench_fetch(args.requests, args.concurrency)
+            log("end-to-end /execute")
+            rows += bench_http(args.requests, args.concurrency, workdir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"cases": rows, "stages": engine.metrics.summary()}, indent=2))
+        return
+    print()
+    print_table(rows)
+    print()
+    print(f"{'stage':<36} {'count':>10} {'total ms':>12} {'p50 ms':>10} {'p95 ms':>10}")
+    for stage, s in engine.metrics.summary().items():
+        print(f"{stage:<36} {s['count']:>10} {s['totalMs']:>12} {s['p50Ms']:>10} {s['p95Ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,34 @@ Python-based workflow execution and AI processing
 
 from __future__ import annotations
 
+import codecs
+import ctypes
+import ctypes.util
+import hashlib
+import heapq
+import itertools
 import json
+import mmap
 import os
-from datetime import datetime
+import queue
+import random
+import re
+import select
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
 
 # ------------------------------
@@ -31,6 +52,1440 @@ def safe_json(body: bytes) -> Dict[str, Any]:
         return {}
 
 
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def remaining_timeout(deadline: Optional[float], cap: float) -> float:
+    """Seconds left before a monotonic deadline, capped; raises once it has passed."""
+    if deadline is None:
+        return cap
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("Request deadline exceeded")
+    return min(cap, left)
+
+
+# ------------------------------
+# Instrumentation
+# ------------------------------
+
+# Log-spaced latency bucket bounds in ms (~12% apart, 0.1 ms to ~2 min).
+LATENCY_BUCKETS_MS = tuple(round(0.1 * 1.12 ** i, 3) for i in range(125))
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram: O(1) observe, percentiles from bucket upper
+    bounds (so accurate to one bucket width), constant memory.
+    """
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def discard(self, value: float):
+        """
+        Undo an observe(value). If the max is removed it falls back to the
+        upper bound of the highest occupied bucket.
+        """
+        i = bisect_left(self.bounds, value)
+        if not self.counts[i]:
+            return
+        self.counts[i] -= 1
+        self.count -= 1
+        self.sum -= value
+        if not self.count:
+            self.sum = self.max = 0.0
+        elif value >= self.max:
+            top = max(j for j, n in enumerate(self.counts) if n)
+            if top < len(self.bounds):
+                self.max = min(self.max, self.bounds[top])
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+
+# Prometheus-style bounds in seconds for hot-path stage timings.
+STAGE_BUCKETS_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "labels", "started")
+
+    def __init__(self, metrics: "EngineMetrics", stage: str, labels: Tuple[Tuple[str, str], ...]):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.stage, self.labels, time.perf_counter() - self.started)
+        return False
+
+
+class EngineMetrics:
+    """
+    Stage timing histograms and counters for the engine's hot paths,
+    rendered in the Prometheus text format by /metrics.
+
+        with metrics.timer("inbox_refresh"):
+            ...
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS_S):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], LatencyHistogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def timer(self, stage: str, **labels: str) -> _StageTimer:
+        return _StageTimer(self, stage, tuple(sorted(labels.items())))
+
+    def observe(self, stage: str, seconds: float, **labels: str):
+        self._observe(stage, tuple(sorted(labels.items())), seconds)
+
+    def _observe(self, stage: str, labels: Tuple[Tuple[str, str], ...], seconds: float):
+        key = (stage, labels)
+        with self._lock:
+            hist = self._stages.get(key)
+            if hist is None:
+                hist = self._stages[key] = LatencyHistogram(self.buckets)
+            hist.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage count, total and percentiles in ms (used by the benchmark)."""
+        out = {}
+        with self._lock:
+            for (stage, labels), hist in sorted(self._stages.items()):
+                name = stage + "".join(f"[{v}]" for _k, v in labels)
+                out[name] = {
+                    "count": hist.count,
+                    "totalMs": round(hist.sum * 1000, 3),
+                    "p50Ms": round(hist.percentile(50) * 1000, 3),
+                    "p95Ms": round(hist.percentile(95) * 1000, 3),
+                }
+        return out
+
+    def render(self, samples: Iterable[Tuple[str, str, str, Dict[str, str], float]] = ()) -> str:
+        """
+        Prometheus text exposition. `samples` are extra (name, kind, help,
+        labels, value) values read at scrape time; kind is gauge or counter.
+        """
+        def fmt(labels: Iterable[Tuple[str, str]]) -> str:
+            pairs = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+            return "{" + pairs + "}" if pairs else ""
+
+        lines = [
+            "# HELP flowmate_stage_seconds Time spent in engine hot-path stages.",
+            "# TYPE flowmate_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, labels), hist in sorted(self._stages.items()):
+                base = (("stage", stage),) + labels
+                cumulative = 0
+                for bound, n in zip(hist.bounds, hist.counts):
+                    cumulative += n
+                    lines.append(f"flowmate_stage_seconds_bucket{fmt(base + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"flowmate_stage_seconds_bucket{fmt(base + (('le', '+Inf'),))} {hist.count}")
+                lines.append(f"flowmate_stage_seconds_sum{fmt(base)} {hist.sum!r}")
+                lines.append(f"flowmate_stage_seconds_count{fmt(base)} {hist.count}")
+            counters: Dict[str, List[str]] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, []).append(f"flowmate_{name}_total{fmt(labels)} {value:g}")
+        for name, counter_lines in counters.items():
+            lines.append(f"# TYPE flowmate_{name}_total counter")
+            lines.extend(counter_lines)
+        seen = set()
+        for name, kind, help_text, labels, value in samples:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP flowmate_{name} {help_text}")
+                lines.append(f"# TYPE flowmate_{name} {kind}")
+            lines.append(f"flowmate_{name}{fmt(sorted(labels.items()))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: Any) -> str:
+    """Label value escaping required by the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = EngineMetrics()
+
+
+# ------------------------------
+# Inbox Index
+# ------------------------------
+
+EMAIL_EXTENSIONS = (".json", ".txt")
+PREVIEW_CHARS = 120
+# JSON emails up to this size are simply json.load()ed; larger ones are
+# streamed so their bodies never become Python strings.
+EMAIL_FULL_PARSE_BYTES = 64 * 1024
+EMAIL_READ_CHUNK = 64 * 1024
+BODY_SEARCH_WINDOW = 1 << 20
+
+
+def preview_text(body: str, limit: int = PREVIEW_CHARS) -> str:
+    return (body[:limit] + "...") if len(body) > limit else body
+
+
+def _read_text_prefix(path: str, chars: int) -> str:
+    """First `chars` characters of a UTF-8 file, reading at most 4 bytes per character."""
+    with open(path, "rb") as f:
+        raw = f.read(chars * 4)
+    return codecs.getincrementaldecoder("utf-8")().decode(raw)[:chars]
+
+
+def _stream_email_json(path: str) -> Dict[str, Any]:
+    """from/subject and a body preview from a large JSON email, in bounded memory."""
+    fields: Dict[str, Any] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        reader = JsonReader(iter(lambda: f.read(EMAIL_READ_CHUNK), ""))
+        if reader.peek() != "{":
+            raise ValueError("Email JSON must be an object")
+        for key in reader.members("{"):
+            if key in ("from", "subject"):
+                fields[key] = reader.read_value()
+            elif key == "body" and reader.peek() == '"':
+                text, truncated = reader.read_string_prefix(PREVIEW_CHARS + 1)
+                fields["preview"] = (text[:PREVIEW_CHARS] + "...") if truncated else preview_text(text)
+            else:
+                reader.skip_value()
+            if len(fields) == 3:
+                break
+    return fields
+
+
+def parse_email_file(path: str, mtime: float, size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Parse one email file into the item shape returned by the monitor.
+    Only a bounded prefix of text bodies is read, and large JSON emails
+    are streamed; the full body is never loaded.
+    """
+    item = {
+        "file": os.path.basename(path),
+        "from": None,
+        "subject": None,
+        "preview": None,
+        "timestamp": datetime.fromtimestamp(mtime).isoformat(),
+    }
+    if size is None:
+        size = os.path.getsize(path)
+    if path.lower().endswith(".json"):
+        if size > EMAIL_FULL_PARSE_BYTES:
+            fields = _stream_email_json(path)
+            item["from"] = fields.get("from")
+            item["subject"] = fields.get("subject")
+            item["preview"] = fields.get("preview", "")
+            return item
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        item["from"] = data.get("from")
+        item["subject"] = data.get("subject")
+        item["preview"] = preview_text(data.get("body") or "")
+    else:
+        item["subject"] = os.path.basename(path)
+        item["preview"] = preview_text(_read_text_prefix(path, PREVIEW_CHARS + 1))
+    return item
+
+
+def _mmap_contains(path: str, needle: bytes) -> bool:
+    """Case-insensitive (ASCII) search of a file via mmap, one window at a time."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(needle):
+            return False
+        if size <= BODY_SEARCH_WINDOW:
+            return needle in f.read().lower()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            step = BODY_SEARCH_WINDOW
+            for start in range(0, size, step):
+                # Overlap windows so a match across a boundary is still seen.
+                if needle in mm[start:start + step + len(needle) - 1].lower():
+                    return True
+    return False
+
+
+def body_contains(path: str, keyword: str) -> bool:
+    """
+    Whether an email's body contains `keyword`, ignoring case. Stops at the
+    first hit. Text bodies are searched through mmap; large JSON bodies are
+    decoded and scanned as they stream in. Case folding of text bodies is
+    ASCII-only.
+    """
+    needle = keyword.lower()
+    if not path.lower().endswith(".json"):
+        return _mmap_contains(path, needle.encode("utf-8"))
+    if os.path.getsize(path) <= EMAIL_FULL_PARSE_BYTES:
+        with open(path, "r", encoding="utf-8") as f:
+            body = json.load(f).get("body")
+        return isinstance(body, str) and needle in body.lower()
+    with open(path, "r", encoding="utf-8") as f:
+        reader = JsonReader(iter(lambda: f.read(EMAIL_READ_CHUNK), ""))
+        if reader.peek() != "{":
+            return False
+        for key in reader.members("{"):
+            if key == "body" and reader.peek() == '"':
+                return reader.string_contains(needle)
+            reader.skip_value()
+    return False
+
+
+def rule_matches(item: Dict[str, Any], match_from: Optional[str], match_subject: Optional[str]) -> bool:
+    """
+    The email monitor's filter with pre-lowercased rules: an empty rule,
+    or an email without that field, does not filter.
+    """
+    if match_from and item.get("from"):
+        if match_from not in str(item["from"]).lower():
+            return False
+    if match_subject and item.get("subject"):
+        if match_subject not in str(item["subject"]).lower():
+            return False
+    return True
+
+
+class InboxIndex:
+    """
+    Persistent index of one inbox folder, keyed by (name, mtime, size).
+
+    refresh() does a single os.scandir pass and only parses files that are
+    new or whose mtime/size changed; everything else is served from memory.
+    Files that fail to parse are remembered as None until they change.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        # name -> ((mtime, size), parsed item or None). Replaced wholesale on
+        # refresh so readers can iterate a snapshot without holding the lock.
+        self._entries: Dict[str, Tuple[Tuple[float, int], Optional[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        self._scan_started = float("-inf")  # monotonic start of the last completed scan
+        self._matchers: "OrderedDict[Tuple, RuleMatcher]" = OrderedDict()
+        # name -> ((mtime, size), {keyword: body contains it})
+        self._body_hits: Dict[str, Tuple[Tuple[float, int], Dict[str, bool]]] = {}
+        self._matchers_lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """
+        Sync the index with the folder. Returns the number of email files.
+        A caller that waited for the lock while another thread scanned
+        reuses that scan if it started after this call did, so concurrent
+        runs on one folder share a scan instead of queueing for their own.
+        """
+        called = time.monotonic()
+        with self._lock:
+            if self._scan_started >= called:
+                return len(self._entries)
+            with metrics.timer("inbox_refresh"):
+                started = time.monotonic()
+                count = self._refresh()
+                self._scan_started = started
+                return count
+
+    def _refresh(self) -> int:
+        entries = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.name.lower().endswith(EMAIL_EXTENSIONS):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                key = (st.st_mtime, st.st_size)
+                cached = self._entries.get(entry.name)
+                if cached is not None and cached[0] == key:
+                    entries[entry.name] = cached
+                    continue
+                try:
+                    with metrics.timer("inbox_parse"):
+                        item = parse_email_file(entry.path, st.st_mtime, st.st_size)
+                except Exception:
+                    item = None
+                entries[entry.name] = (key, item)
+        self._entries = entries
+        self._body_hits = {
+            name: hits for name, hits in self._body_hits.items()
+            if name in entries and entries[name][0] == hits[0]
+        }
+        return len(entries)
+
+    def body_contains(self, item: Dict[str, Any], keyword: str) -> bool:
+        """body_contains() for an indexed email, cached until the file changes."""
+        name = item["file"]
+        entry = self._entries.get(name)
+        if entry is None:
+            return False
+        cached = self._body_hits.get(name)
+        if cached is None or cached[0] != entry[0]:
+            cached = self._body_hits[name] = (entry[0], {})
+        hit = cached[1].get(keyword)
+        if hit is None:
+            try:
+                with metrics.timer("body_search"):
+                    hit = body_contains(os.path.join(self.folder, name), keyword)
+            except (OSError, ValueError):
+                hit = False
+            cached[1][keyword] = hit
+        return hit
+
+    def items(self):
+        """Yield (mtime, item) for every parsed email in the index."""
+        for (mtime, _size), item in list(self._entries.values()):
+            if item is not None:
+                yield mtime, item
+
+    def snapshot(self) -> Dict[str, Tuple[Tuple[float, int], Optional[Dict[str, Any]]]]:
+        """The current name -> ((mtime, size), item) mapping. Do not mutate."""
+        return self._entries
+
+    def newest_first(self, match_from: Optional[str] = None,
+                     match_subject: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield copies of the items passing the from/subject filters,
+        newest first (ties in scan order). heapify is O(n) and each item
+        pulled costs O(log n), so a consumer that stops after a few matches
+        never sorts the whole folder.
+        """
+        match_from = match_from.lower() if match_from else None
+        match_subject = match_subject.lower() if match_subject else None
+        with metrics.timer("inbox_filter"):
+            heap = [
+                (-mtime, seq, item)
+                for seq, (mtime, item) in enumerate(self.items())
+                if rule_matches(item, match_from, match_subject)
+            ]
+            heapq.heapify(heap)
+        while heap:
+            yield dict(heapq.heappop(heap)[2])
+
+    def matcher(self, rules: Tuple[Tuple[Optional[str], Optional[str]], ...]) -> "RuleMatcher":
+        """Return the compiled matcher for a rule set, reusing it across polls."""
+        with self._matchers_lock:
+            matcher = self._matchers.get(rules)
+            if matcher is None:
+                matcher = self._matchers[rules] = RuleMatcher(rules)
+                while len(self._matchers) > 32:
+                    self._matchers.popitem(last=False)
+            else:
+                self._matchers.move_to_end(rules)
+            return matcher
+
+
+# ------------------------------
+# Inbox Rule Matching
+# ------------------------------
+
+class AhoCorasick:
+    """Multi-pattern substring matcher; search() returns the ids of patterns found."""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[int]] = [frozenset()]
+        out: List[Set[int]] = [set()]
+        for pid, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    out.append(set())
+                    self._goto[state][ch] = nxt
+                state = nxt
+            out[state].add(pid)
+
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self._goto[state].items():
+                pending.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0) if state else 0
+                out[nxt] |= out[self._fail[nxt]]
+        self._out = [frozenset(o) for o in out]
+
+    def search(self, text: str) -> Set[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class RuleMatcher:
+    """
+    Compiled (matchFrom, matchSubject) rules for many flows watching one inbox.
+
+    All rule strings go into one lowercase Aho-Corasick automaton, so each
+    email's from/subject is scanned once no matter how many flows are
+    registered. Per-email results are cached until the email changes.
+    Rule semantics follow rule_matches: an empty rule, or an email
+    without that field, does not filter.
+    """
+
+    def __init__(self, rules: Tuple[Tuple[Optional[str], Optional[str]], ...]):
+        self.rules = rules
+        patterns: Dict[str, int] = {}
+        by_field: List[Dict[int, Set[int]]] = [{}, {}]
+        unconstrained: List[Set[int]] = [set(), set()]
+        for rule_id, rule in enumerate(rules):
+            for field, value in enumerate(rule):
+                if not value:
+                    unconstrained[field].add(rule_id)
+                    continue
+                pid = patterns.setdefault(value.lower(), len(patterns))
+                by_field[field].setdefault(pid, set()).add(rule_id)
+        self._automaton = AhoCorasick(list(patterns))
+        self._by_field = by_field
+        self._unconstrained = [frozenset(u) for u in unconstrained]
+        self._all = frozenset(range(len(rules)))
+        # file name -> (item object the result was computed for, matching rule ids)
+        self._cache: Dict[str, Tuple[Dict[str, Any], FrozenSet[int]]] = {}
+
+    def _field_rules(self, field: int, value: Any) -> Set[int]:
+        if not value:
+            return self._all
+        rules = set(self._unconstrained[field])
+        for pid in self._automaton.search(str(value).lower()):
+            rules |= self._by_field[field].get(pid, set())
+        return rules
+
+    def _rules_for(self, item: Dict[str, Any]) -> FrozenSet[int]:
+        return frozenset(self._field_rules(0, item.get("from")) & self._field_rules(1, item.get("subject")))
+
+    def match(self, index: "InboxIndex", limit: int = 5) -> List[List[Dict[str, Any]]]:
+        """One pass over the index; returns the newest `limit` matches per rule."""
+        with metrics.timer("inbox_match"):
+            return self._match(index, limit)
+
+    def _match(self, index: "InboxIndex", limit: int) -> List[List[Dict[str, Any]]]:
+        heaps: List[List[Tuple[float, int, Dict[str, Any]]]] = [[] for _ in self.rules]
+        cache = {}
+        for seq, (mtime, item) in enumerate(index.items()):
+            cached = self._cache.get(item["file"])
+            if cached is not None and cached[0] is item:
+                rule_ids = cached[1]
+            else:
+                rule_ids = self._rules_for(item)
+            cache[item["file"]] = (item, rule_ids)
+            entry = (mtime, -seq, item)
+            for rule_id in rule_ids:
+                heap = heaps[rule_id]
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        self._cache = cache
+        return [[dict(item) for _m, _s, item in sorted(heap, reverse=True)] for heap in heaps]
+
+
+# ------------------------------
+# Inbox Watching
+# ------------------------------
+
+class _Inotify:
+    """Minimal Linux inotify wrapper (ctypes): wait() reports that a folder changed."""
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, folder: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM
+                | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE)
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds; True if any event arrived (events are drained)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InboxWatcher:
+    """
+    Watches one inbox folder and publishes new or changed emails as a
+    numbered event log.
+
+    Change detection uses inotify where available and falls back to
+    periodic scandir diffs through the folder's InboxIndex. A file is only
+    published once its mtime is at least `settle` seconds old, so
+    partially written messages are held back until the writer is done.
+    Emails already present when the watcher starts are not published.
+    `on_scan` is called from the watcher thread after every scan.
+    """
+
+    def __init__(self, index: InboxIndex, settle: float = 0.5, poll_interval: float = 1.0,
+                 log_size: int = 1000, on_scan: Optional[Callable[[], None]] = None):
+        self.index = index
+        self.on_scan = on_scan
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.mode = "polling"
+        self.seq = 0
+        self.log: "deque[Tuple[int, Dict[str, Any]]]" = deque(maxlen=log_size)
+        self.cond = threading.Condition()
+        self._seen: Dict[str, Tuple[float, int]] = {}
+        self._unsettled = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"inbox-watch-{index.folder}", daemon=True)
+
+    def start(self):
+        try:
+            self._source: Optional[_Inotify] = _Inotify(self.index.folder)
+            self.mode = "inotify"
+        except (OSError, AttributeError):
+            self._source = None
+        try:
+            self.index.refresh()
+            self._seen = {name: key for name, (key, _item) in self.index.snapshot().items()}
+            self._thread.start()
+        except BaseException:
+            if self._source is not None:
+                self._source.close()
+            raise
+
+    def stop(self):
+        self._stop.set()
+        with self.cond:
+            self.cond.notify_all()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def _run(self):
+        source = self._source
+        try:
+            while not self._stop.is_set():
+                if source is None:
+                    self._stop.wait(self.settle if self._unsettled else self.poll_interval)
+                # inotify can miss changes (e.g. on network mounts), so still
+                # rescan every so often even without events.
+                elif source.wait(self.settle if self._unsettled else self.poll_interval * 30):
+                    # Debounce bursts of events from one write.
+                    quiet_deadline = time.monotonic() + 5 * self.settle
+                    while time.monotonic() < quiet_deadline and source.wait(self.settle / 5):
+                        pass
+                if self._stop.is_set():
+                    break
+                try:
+                    self._scan()
+                except OSError:
+                    pass
+                if self.on_scan is not None:
+                    self.on_scan()
+        finally:
+            if source is not None:
+                source.close()
+
+    def _scan(self):
+        self.index.refresh()
+        snapshot = self.index.snapshot()
+        now = time.time()
+        fresh = []
+        unsettled = False
+        seen = {}
+        for name, (key, item) in snapshot.items():
+            if self._seen.get(name) == key:
+                seen[name] = key
+                continue
+            if now - key[0] < self.settle:
+                unsettled = True
+                continue
+            seen[name] = key
+            if item is not None:
+                fresh.append((key[0], item))
+        self._seen = seen
+        self._unsettled = unsettled
+        if not fresh:
+            return
+        fresh.sort(key=lambda pair: pair[0])
+        with self.cond:
+            for _mtime, item in fresh:
+                self.seq += 1
+                self.log.append((self.seq, item))
+            self.cond.notify_all()
+
+
+class WatchSubscription:
+    """One flow's view of an InboxWatcher; `cursor` is the last event it has seen."""
+
+    def __init__(self, watcher: InboxWatcher, folder: str,
+                 match_from: Optional[str], match_subject: Optional[str],
+                 keyword: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.watcher = watcher
+        self.folder = folder
+        self.match_from = match_from.lower() if match_from else None
+        self.match_subject = match_subject.lower() if match_subject else None
+        self.keyword = keyword
+        self.cursor = watcher.seq
+        self.last_polled = time.monotonic()
+        self.closed = False
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "folder": self.folder,
+            "matchFrom": self.match_from,
+            "matchSubject": self.match_subject,
+            "keyword": self.keyword,
+            "cursor": self.cursor,
+            "mode": self.watcher.mode,
+        }
+
+    def poll(self, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Wait up to `timeout` seconds for new matching emails and advance the
+        cursor. Bodies are searched for the keyword outside the watcher lock.
+        """
+        deadline = time.monotonic() + timeout
+        watcher = self.watcher
+        while True:
+            with watcher.cond:
+                matches = [
+                    dict(item) for seq, item in watcher.log
+                    if seq > self.cursor and rule_matches(item, self.match_from, self.match_subject)
+                ]
+                self.cursor = watcher.seq
+                self.last_polled = time.monotonic()
+            if self.keyword:
+                matches = [item for item in matches if watcher.index.body_contains(item, self.keyword)]
+            with watcher.cond:
+                left = deadline - time.monotonic()
+                if matches or left <= 0 or self.closed or watcher.stopped:
+                    return matches
+                if watcher.seq == self.cursor:
+                    watcher.cond.wait(left)
+
+
+class InboxWatchHub:
+    """
+    Owns one InboxWatcher per folder and the subscriptions on it. Watchers
+    start with their first subscriber and stop with their last one;
+    subscriptions that are not polled for `idle_ttl` seconds are dropped
+    by the watcher threads, so abandoned ones do not keep theirs alive.
+    """
+
+    def __init__(self, integrations: "RealIntegrations", settle: float = 0.5,
+                 poll_interval: float = 1.0, idle_ttl: float = 600.0):
+        self.integrations = integrations
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.idle_ttl = idle_ttl
+        self._watchers: Dict[str, InboxWatcher] = {}
+        self._subs: Dict[str, WatchSubscription] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, folder: str, match_from: Optional[str] = None,
+                  match_subject: Optional[str] = None, keyword: Optional[str] = None) -> WatchSubscription:
+        os.makedirs(folder, exist_ok=True)
+        index = self.integrations.inbox_index(folder)
+        self._reap()
+        with self._lock:
+            watcher = self._watchers.get(index.folder)
+            if watcher is None:
+                watcher = InboxWatcher(index, settle=self.settle, poll_interval=self.poll_interval,
+                                       on_scan=self._reap)
+                watcher.start()
+                self._watchers[index.folder] = watcher
+            sub = WatchSubscription(watcher, folder, match_from, match_subject, keyword)
+            self._subs[sub.id] = sub
+        return sub
+
+    def get(self, sub_id: str) -> Optional[WatchSubscription]:
+        with self._lock:
+            return self._subs.get(sub_id)
+
+    def list(self) -> List[WatchSubscription]:
+        with self._lock:
+            return list(self._subs.values())
+
+    def unsubscribe(self, sub_id: str) -> bool:
+        with self._lock:
+            sub = self._subs.pop(sub_id, None)
+            if sub is None:
+                return False
+            sub.closed = True
+            folder = sub.watcher.index.folder
+            if not any(s.watcher is sub.watcher for s in self._subs.values()):
+                self._watchers.pop(folder, None)
+                sub.watcher.stop()
+        with sub.watcher.cond:
+            sub.watcher.cond.notify_all()
+        return True
+
+    def _reap(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for sub in self.list():
+            if sub.last_polled < cutoff:
+                self.unsubscribe(sub.id)
+
+
+# ------------------------------
+# HTTP Fetch Layer
+# ------------------------------
+
+class FetchResponse:
+    """
+    A fetched body plus the metadata needed to serve and revalidate it.
+
+    Bodies larger than the fetcher's max_entry_bytes are not buffered:
+    `body` is None and the caller must consume `chunks` once and close().
+    """
+
+    __slots__ = ("url", "status", "content_type", "encoding", "body",
+                 "etag", "last_modified", "fetched_at", "chunks", "_raw")
+
+    def __init__(self, url: str, status: int, content_type: str, encoding: Optional[str],
+                 body: Optional[bytes], etag: Optional[str], last_modified: Optional[str],
+                 fetched_at: float, chunks: Optional[Iterator[bytes]] = None, raw: Any = None):
+        self.url = url
+        self.status = status
+        self.content_type = content_type
+        self.encoding = encoding
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.chunks = chunks
+        self._raw = raw
+
+    @property
+    def streamed(self) -> bool:
+        return self.body is None
+
+    def text(self) -> str:
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+    def iter_text(self) -> Iterator[str]:
+        """Decode the body incrementally, whether buffered or streamed."""
+        decoder = codecs.getincrementaldecoder(self.encoding or "utf-8")(errors="replace")
+        for chunk in ([self.body] if self.body is not None else self.chunks):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def close(self):
+        if self._raw is not None:
+            self._raw.close()
+
+    def refreshed(self) -> "FetchResponse":
+        return FetchResponse(self.url, self.status, self.content_type, self.encoding,
+                             self.body, self.etag, self.last_modified, time.monotonic())
+
+
+class _InFlight:
+    """A fetch in progress that other callers of the same URL wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[FetchResponse] = None
+        self.error: Optional[BaseException] = None
+
+
+class HttpFetcher:
+    """
+    Shared GET layer for integrations.
+
+    - Connections are pooled through one requests.Session.
+    - 200 responses are kept in a TTL + LRU cache; stale entries are
+      revalidated with If-None-Match / If-Modified-Since.
+    - Concurrent fetches of the same URL are coalesced into one request.
+    - Bodies over max_entry_bytes are handed back as a stream, uncached.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 256,
+                 max_entry_bytes: int = 1 << 20, pool_size: int = 16):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache: "OrderedDict[str, FetchResponse]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "coalesced": 0, "errors": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, entries=len(self._cache), ttl=self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def fetch(self, url: str, timeout: float = 8.0) -> FetchResponse:
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached is not None and time.monotonic() - cached.fetched_at < self.ttl:
+                self._cache.move_to_end(url)
+                self.counters["hits"] += 1
+                return cached
+            call = self._inflight.get(url)
+            leader = call is None
+            if leader:
+                call = self._inflight[url] = _InFlight()
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight fetch of {url}")
+            if call.error is not None:
+                raise call.error
+            if call.response.streamed:
+                # A stream has a single consumer; fetch our own copy.
+                return self._fetch(url, None, timeout)
+            return call.response
+
+        try:
+            call.response = self._fetch(url, cached, timeout)
+            return call.response
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+            call.done.set()
+
+    def _fetch(self, url: str, cached: Optional[FetchResponse], timeout: float) -> FetchResponse:
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        with metrics.timer("http_fetch"):
+            r = self.session.get(url, timeout=timeout, headers=headers, stream=True)
+        metrics.inc("http_fetch_responses", code=str(r.status_code))
+        if r.status_code == 304 and cached is not None:
+            r.close()
+            resp = cached.refreshed()
+            self._store(resp, "revalidated")
+            return resp
+
+        # Buffer up to max_entry_bytes; anything larger stays a stream.
+        parts: List[bytes] = []
+        size = 0
+        chunks = r.iter_content(self.chunk_size)
+        with metrics.timer("http_read_body"):
+            for chunk in chunks:
+                parts.append(chunk)
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    break
+        streamed = size > self.max_entry_bytes
+        if not streamed:
+            r.close()
+
+        resp = FetchResponse(
+            url=url,
+            status=r.status_code,
+            content_type=r.headers.get("content-type", "").lower(),
+            encoding=r.encoding,
+            body=None if streamed else b"".join(parts),
+            etag=r.headers.get("etag"),
+            last_modified=r.headers.get("last-modified"),
+            fetched_at=time.monotonic(),
+            chunks=itertools.chain(parts, chunks) if streamed else None,
+            raw=r if streamed else None,
+        )
+        cacheable = r.status_code == 200 and not streamed
+        self._store(resp if cacheable else None, "misses")
+        return resp
+
+    def _store(self, resp: Optional[FetchResponse], counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+            if resp is None:
+                return
+            self._cache[resp.url] = resp
+            self._cache.move_to_end(resp.url)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+
+# ------------------------------
+# JSON Path Expressions
+# ------------------------------
+
+WILDCARD = "*"
+_PATH_TOKEN = re.compile(r"\[(\*|-?\d+)\]|([^.\[\]]+)")
+
+
+def _path_children(node: Any, step: str) -> Iterator[Any]:
+    if step == WILDCARD:
+        if isinstance(node, dict):
+            yield from node.values()
+        elif isinstance(node, list):
+            yield from node
+    elif isinstance(node, dict):
+        if step in node:
+            yield node[step]
+    elif isinstance(node, list) and step.lstrip("-").isdigit():
+        i = int(step)
+        if -len(node) <= i < len(node):
+            yield node[i]
+
+
+class JsonPath:
+    """
+    A compiled path such as "owner.login", "items[0].name" or "items[*].id".
+    Numeric segments index arrays ("items.0" == "items[0]"); "*" matches
+    every key or element. Wildcard paths select a list of values.
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        body = expr.strip()
+        if body.startswith("$"):
+            body = body[1:].lstrip(".")
+        self.steps: Tuple[str, ...] = tuple(a or b for a, b in _PATH_TOKEN.findall(body))
+        self.wildcard = WILDCARD in self.steps
+        # Streaming walks forward only, so negative indices need the whole document.
+        self.streamable = not any(s.startswith("-") and s[1:].isdigit() for s in self.steps)
+
+    def find(self, data: Any, start: int = 0) -> List[Any]:
+        nodes = [data]
+        for step in self.steps[start:]:
+            nodes = [child for node in nodes for child in _path_children(node, step)]
+            if not nodes:
+                break
+        return nodes
+
+    def shape(self, found: List[Any]) -> Any:
+        if self.wildcard:
+            return found
+        return found[0] if found else None
+
+    def evaluate(self, data: Any) -> Any:
+        return self.shape(self.find(data))
+
+
+class _PathNode:
+    """Trie node over the steps of several paths, used for streaming."""
+
+    __slots__ = ("depth", "children", "terminal", "paths")
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.children: Dict[str, "_PathNode"] = {}
+        self.terminal: List[int] = []  # paths ending here
+        self.paths: List[int] = []     # paths passing through or ending here
+
+
+class _StopStream(Exception):
+    pass
+
+
+_STRING_PIECE = re.compile(r"[^\\]+|\\u[0-9a-fA-F]{0,4}|\\.?", re.S)
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _decode_string_fragment(raw: str) -> Tuple[str, str]:
+    """
+    Decode the escapes in part of a JSON string's contents. Returns the
+    text and the raw tail that cannot be decoded yet: an escape cut off at
+    the end, plus a high surrogate escape waiting for its pair.
+    """
+    out: List[str] = []
+    high_at = None  # raw offset of a trailing high surrogate escape
+    for m in _STRING_PIECE.finditer(raw):
+        piece = m.group()
+        if m.end() == len(raw) and piece[0] == "\\" and (len(piece) == 1 or piece[1] == "u" and len(piece) < 6):
+            if high_at is not None:
+                out.pop()
+                return "".join(out), raw[high_at:]
+            return "".join(out), raw[m.start():]
+        code = int(piece[2:], 16) if piece[:2] == "\\u" and len(piece) == 6 else None
+        if code is not None and 0xDC00 <= code < 0xE000 and high_at is not None:
+            out[-1] = chr(0x10000 + ((ord(out[-1]) - 0xD800) << 10) + code - 0xDC00)
+            high_at = None
+            continue
+        high_at = None
+        if piece[0] != "\\":
+            out.append(piece)
+        elif code is not None:
+            out.append(chr(code))
+            if 0xD800 <= code < 0xDC00:
+                if m.end() == len(raw):
+                    out.pop()
+                    return "".join(out), raw[m.start():]
+                high_at = m.start()
+        else:
+            # Malformed escapes are kept as written rather than held back.
+            out.append(_SIMPLE_ESCAPES.get(piece[1], piece[1:]) if len(piece) == 2 else piece)
+    return "".join(out), ""
+
+
+class JsonReader:
+    """
+    Pull reader over a stream of JSON text chunks. It can skip a value
+    without building it, and only materializes the values it is asked
+    to read. Memory stays bounded by the chunk size plus what is read.
+    """
+
+    _WS = re.compile(r"\s*")
+    _STRUCT = re.compile(r'["{}\[\]]')
+    _STRING_SPECIAL = re.compile(r'["\\]')
+    _SCALAR_END = re.compile(r"[,}\]\s]")
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self.buf = ""
+        self.pos = 0
+        self._captured: Optional[List[str]] = None
+        self._cap_start = 0
+
+    def _fill(self) -> bool:
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        if self._captured is not None:
+            self._captured.append(self.buf[self._cap_start:self.pos])
+            self._cap_start = 0
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _need_more(self):
+        if not self._fill():
+            raise ValueError("Unexpected end of JSON")
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at end of input)."""
+        while True:
+            self.pos = self._WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON at offset {self.pos}")
+        self.pos += 1
+
+    def _skip_string(self):
+        self.pos += 1  # opening quote
+        while True:
+            m = self._STRING_SPECIAL.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                self._need_more()
+            elif m.group() == '"':
+                self.pos = m.end()
+                return
+            elif m.end() < len(self.buf):
+                self.pos = m.end() + 1  # escaped character
+            else:
+                self.pos = m.start()
+                self._need_more()
+
+    def _skip_scalar(self):
+        while True:
+            m = self._SCALAR_END.search(self.buf, self.pos)
+            if m is not None:
+                self.pos = m.start()
+                return
+            self.pos = len(self.buf)
+            if not self._fill():
+                return
+
+    def skip_value(self):
+        c = self.peek()
+        if c == '"':
+            return self._skip_string()
+        if c == "":
+            raise ValueError("Unexpected end of JSON")
+        if c not in "{[":
+            return self._skip_scalar()
+        depth = 0
+        while True:
+            m = self._STRUCT.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                self._need_more()
+                continue
+            if m.group() == '"':
+                self.pos = m.start()
+                self._skip_string()
+                continue
+            self.pos = m.end()
+            depth += 1 if m.group() in "{[" else -1
+            if depth == 0:
+                return
+
+    def _string_segments(self) -> Iterator[str]:
+        """Yield the raw (still escaped) text of the string at the cursor, consuming it."""
+        self.pos += 1  # opening quote
+        while True:
+            m = self._STRING_SPECIAL.search(self.buf, self.pos)
+            if m is None:
+                yield self.buf[self.pos:]
+                self.pos = len(self.buf)
+                self._need_more()
+            elif m.group() == '"':
+                yield self.buf[self.pos:m.start()]
+                self.pos = m.end()
+                return
+            elif m.end() < len(self.buf):
+                yield self.buf[self.pos:m.end() + 1]
+                self.pos = m.end() + 1
+            else:
+                yield self.buf[self.pos:m.start()]
+                self.pos = m.start()
+                self._need_more()
+
+    def read_string_prefix(self, chars: int) -> Tuple[str, bool]:
+        """
+        Decode at most `chars` characters of the string at the cursor and
+        skip the rest. Returns (text, truncated).
+        """
+        raw_limit = chars * 6  # an escape is at most 6 raw characters
+        parts, kept, total = [], 0, 0
+        for segment in self._string_segments():
+            total += len(segment)
+            if kept < raw_limit:
+                parts.append(segment[:raw_limit - kept])
+                kept += len(parts[-1])
+        raw = "".join(parts)
+        # The cut may split an escape sequence; back off until it decodes.
+        for end in range(len(raw), max(-1, len(raw) - 7), -1):
+            try:
+                text = json.loads('"' + raw[:end] + '"')
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError("Invalid JSON string")
+        return text[:chars], total > kept or len(text) > chars
+
+    def string_contains(self, needle: str) -> bool:
+        """
+        Lowercase search of the decoded string at the cursor, chunk by
+        chunk; an escape split across chunks is carried to the next one.
+        Returns at the first hit, leaving the cursor inside the string.
+        """
+        tail = pending = ""
+        for segment in self._string_segments():
+            text, pending = _decode_string_fragment(pending + segment)
+            window = tail + text.lower()
+            if needle in window:
+                return True
+            tail = window[max(0, len(window) - len(needle) + 1):]
+        return False
+
+    def read_value(self) -> Any:
+        self.peek()
+        self._captured, self._cap_start = [], self.pos
+        try:
+            self.skip_value()
+            self._captured.append(self.buf[self._cap_start:self.pos])
+            return json.loads("".join(self._captured))
+        finally:
+            self._captured = None
+
+    def members(self, container: str) -> Iterator[str]:
+        """
+        Iterate an object ("{") or array ("[") at the cursor, yielding each
+        key (array indices as strings). The caller must consume the value
+        (read or skip) before advancing the iterator.
+        """
+        close = "}" if container == "{" else "]"
+        self.expect(container)
+        if self.peek() == close:
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            if container == "{":
+                key = self.read_value()
+                self.expect(":")
+                yield str(key)
+            else:
+                yield str(index)
+                index += 1
+            c = self.peek()
+            self.pos += 1
+            if c == close:
+                return
+            if c != ",":
+                raise ValueError(f"Expected ',' or '{close}' in JSON")
+
+
+class JsonPathSet:
+    """
+    One or more compiled paths evaluated together. With a single path the
+    result is that path's value; with several it is {expr: value}.
+    """
+
+    def __init__(self, exprs: Tuple[str, ...]):
+        self.paths = tuple(JsonPath(e) for e in exprs)
+        self.streamable = all(p.streamable for p in self.paths)
+        self.root = _PathNode(0)
+        for i, path in enumerate(self.paths):
+            node = self.root
+            node.paths.append(i)
+            for step in path.steps:
+                node = node.children.setdefault(step, _PathNode(node.depth + 1))
+                node.paths.append(i)
+            node.terminal.append(i)
+
+    @property
+    def expr(self) -> str:
+        return ", ".join(p.expr for p in self.paths)
+
+    def _shape(self, values: List[Any]) -> Any:
+        if len(self.paths) == 1:
+            return values[0]
+        return {p.expr: v for p, v in zip(self.paths, values)}
+
+    def evaluate(self, data: Any) -> Any:
+        return self._shape([p.evaluate(data) for p in self.paths])
+
+    def extract_stream(self, chunks: Iterable[str]) -> Any:
+        """
+        Evaluate every path over streamed JSON text in one forward pass.
+        Unselected subtrees are skipped unparsed, and reading stops as soon
+        as every non-wildcard path has its value (if there are no wildcards).
+        """
+        found: List[List[Any]] = [[] for _ in self.paths]
+        stop_early = not any(p.wildcard for p in self.paths)
+        reader = JsonReader(chunks)
+
+        def take(node: _PathNode, value: Any):
+            for i in node.paths:
+                found[i].extend(self.paths[i].find(value, node.depth))
+            if stop_early and all(found):
+                raise _StopStream()
+
+        def walk(node: _PathNode):
+            if node.terminal:
+                return take(node, reader.read_value())
+            c = reader.peek()
+            if c not in ("{", "["):
+                return reader.skip_value()
+            wildcard = node.children.get(WILDCARD)
+            for key in reader.members(c):
+                matched = [n for n in (node.children.get(key), wildcard) if n is not None]
+                if not matched:
+                    reader.skip_value()
+                elif len(matched) == 1:
+                    walk(matched[0])
+                else:
+                    value = reader.read_value()
+                    for n in matched:
+                        take(n, value)
+
+        try:
+            walk(self.root)
+        except _StopStream:
+            pass
+        return self._shape([p.shape(f) for p, f in zip(self.paths, found)])
+
+
+@lru_cache(maxsize=512)
+def _compile_json_paths(exprs: Tuple[str, ...]) -> JsonPathSet:
+    return JsonPathSet(exprs)
+
+
+def compile_json_paths(spec: Union[str, List[str], None]) -> Optional[JsonPathSet]:
+    """
+    Compile a flow's `jsonPath` (one expression, comma-separated expressions,
+    or a list) into a cached JsonPathSet. Returns None when there is no path.
+    """
+    if not spec:
+        return None
+    items = spec.split(",") if isinstance(spec, str) else [str(s) for s in spec]
+    exprs = tuple(e.strip() for e in items if e and e.strip())
+    return _compile_json_paths(exprs) if exprs else None
+
+
 # ------------------------------
 # Real Integrations (Minimal)
 # ------------------------------
@@ -38,241 +1493,1506 @@ def safe_json(body: bytes) -> Dict[str, Any]:
 class RealIntegrations:
     """Small, reliable 'real' integrations for a capstone demo."""
 
+    def __init__(self):
+        self._inboxes: Dict[str, InboxIndex] = {}
+        self._inboxes_lock = threading.Lock()
+        self.fetcher = HttpFetcher(
+            ttl=env_int("FLOWMATE_FETCH_TTL", 30),
+            max_entries=env_int("FLOWMATE_FETCH_CACHE_SIZE", 256),
+        )
+
+    def inbox_index(self, folder: str) -> InboxIndex:
+        """Return the persistent index for a folder, creating it on first use."""
+        key = os.path.abspath(folder)
+        with self._inboxes_lock:
+            index = self._inboxes.get(key)
+            if index is None:
+                index = self._inboxes[key] = InboxIndex(key)
+        return index
+
     def email_folder_monitor(
         self,
         folder: str,
         match_from: Optional[str] = None,
         match_subject: Optional[str] = None,
+        keyword: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
-        Checks a folder for files that represent emails.
-        File format (simple JSON recommended):
-          {
-            "from": "alerts@company.com",
-            "subject": "Server Down",
-            "body": "..."
-          }
+        Newest five emails in a folder passing the from/subject rules and,
+        if `keyword` is given, whose body contains it (case-insensitive).
+        The same lookup the email trigger runs, for callers outside a flow.
         Returns: { found: bool, matches: [...], checked: int }
         """
         os.makedirs(folder, exist_ok=True)
 
-        files = []
-        for name in os.listdir(folder):
-            if name.lower().endswith((".json", ".txt")):
-                files.append(os.path.join(folder, name))
-
-        matches = []
-        for path in sorted(files, key=lambda p: os.path.getmtime(p), reverse=True):
-            item = {
-                "file": os.path.basename(path),
-                "from": None,
-                "subject": None,
-                "preview": None,
-                "timestamp": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(),
-            }
-            try:
-                if path.lower().endswith(".json"):
-                    with open(path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    item["from"] = data.get("from")
-                    item["subject"] = data.get("subject")
-                    body = data.get("body") or ""
-                    item["preview"] = (body[:120] + "...") if len(body) > 120 else body
-                else:
-                    with open(path, "r", encoding="utf-8") as f:
-                        body = f.read()
-                    item["subject"] = os.path.basename(path)
-                    item["preview"] = (body[:120] + "...") if len(body) > 120 else body
-
-                if match_from and item.get("from"):
-                    if match_from.lower() not in str(item["from"]).lower():
-                        continue
-                if match_subject and item.get("subject"):
-                    if match_subject.lower() not in str(item["subject"]).lower():
-                        continue
-
-                matches.append(item)
-            except Exception:
-                continue
-
+        index = self.inbox_index(folder)
+        checked = index.refresh()
+        matches: Iterable[Dict[str, Any]] = index.newest_first(match_from, match_subject)
+        if keyword:
+            needle = keyword.lower()
+            matches = (item for item in matches if index.body_contains(item, needle))
+        matches = list(itertools.islice(matches, EMAIL_MATCH_LIMIT))
         return {
             "found": len(matches) > 0,
-            "checked": len(files),
-            "matches": matches[:5],
+            "checked": checked,
+            "matches": matches,
         }
 
-    def pull_notification_data(self, url: str, json_path: Optional[str] = None) -> Dict[str, Any]:
+    def email_folder_monitor_many(
+        self,
+        folder: str,
+        rules: List[Tuple[Optional[str], Optional[str]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest five matches for several (match_from, match_subject) rules at
+        once: one folder scan and one matching pass serve every rule.
+        Returns { found: bool, matches: [...], checked: int } per rule, in order.
+        """
+        os.makedirs(folder, exist_ok=True)
+
+        index = self.inbox_index(folder)
+        checked = index.refresh()
+        per_rule = index.matcher(tuple(rules)).match(index, limit=5)
+        return [
+            {"found": len(matches) > 0, "checked": checked, "matches": matches}
+            for matches in per_rule
+        ]
+
+    # Without a jsonPath the whole document is only echoed back when small.
+    ECHO_LIMIT = 64 * 1024
+
+    def pull_notification_data(
+        self,
+        url: str,
+        json_path: Union[str, List[str], None] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
         """
         Fetch non-sensitive notification-type data from a URL.
+        Goes through the shared, cached fetcher; `deadline` is a
+        time.monotonic() value bounding the request timeout.
+        `json_path` selects values with JsonPath expressions; large bodies
+        are scanned as a stream so only the selected values are held.
         """
-        r = requests.get(url, timeout=8)
-        content_type = r.headers.get("content-type", "").lower()
-
-        if "application/json" in content_type or r.text.strip().startswith("{") or r.text.strip().startswith("["):
-            data = r.json()
-            extracted = None
-            if json_path:
-                cur: Any = data
-                for key in json_path.split("."):
-                    if isinstance(cur, dict) and key in cur:
-                        cur = cur[key]
-                    else:
-                        cur = None
-                        break
-                extracted = cur
+        paths = compile_json_paths(json_path)
+        r = self.fetcher.fetch(url, timeout=remaining_timeout(deadline, 8))
+        try:
+            # Look at just enough of the body to tell JSON from text.
+            texts = r.iter_text()
+            head = ""
+            for text in texts:
+                head += text
+                if head.strip():
+                    break
+            texts = itertools.chain([head], texts)
+            first = head.lstrip()[:1]
+
+            if "application/json" in r.content_type or first in ("{", "["):
+                with metrics.timer("json_extract", streamed=str(r.streamed).lower()):
+                    return self._json_result(url, r, texts, paths)
+
+            preview = ""
+            for text in texts:
+                preview += text
+                if len(preview.strip()) > 300:
+                    break
+            preview = preview.strip().replace("\n", " ")
+            preview = preview[:300] + ("..." if len(preview) > 300 else "")
             return {
-                "kind": "json",
+                "kind": "text",
                 "url": url,
-                "extracted": extracted,
-                "data": data if extracted is None else None,
+                "preview": preview,
             }
+        finally:
+            r.close()
 
-        preview = r.text.strip().replace("\n", " ")
-        preview = preview[:300] + ("..." if len(preview) > 300 else "")
-        return {
-            "kind": "text",
-            "url": url,
-            "preview": preview,
-        }
+    def _json_result(self, url: str, r: FetchResponse, texts: Iterator[str],
+                     paths: Optional[JsonPathSet]) -> Dict[str, Any]:
+        result = {"kind": "json", "url": url, "extracted": None, "data": None}
+        if paths is not None:
+            if r.streamed and paths.streamable:
+                result["extracted"] = paths.extract_stream(texts)
+            else:
+                data = json.loads(r.body if not r.streamed else "".join(texts))
+                result["extracted"] = paths.evaluate(data)
+        elif not r.streamed and len(r.body) <= self.ECHO_LIMIT:
+            result["data"] = json.loads(r.body)
+        else:
+            result["truncated"] = True
+        return result
 
 
 # ------------------------------
-# Workflow Executor
+# Execution Journal
 # ------------------------------
 
-class WorkflowExecutor:
+class FlowStats:
+    """Rolling counters and latency histogram for one flow, type, or the whole engine."""
+
     def __init__(self):
-        self.integrations = RealIntegrations()
+        self.runs = 0
+        self.success = 0
+        self.failed = 0
+        self.last_run_at: Optional[str] = None
+        self.latency = LatencyHistogram()
 
-    def execute(self, flow: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a flow definition sent by the backend."""
-        flow_type = flow.get("type")
-        flow_name = flow.get("name", "Untitled Flow")
+    def add(self, status: str, duration_ms: float, finished_at: Optional[str]):
+        self.runs += 1
+        if status == "success":
+            self.success += 1
+        else:
+            self.failed += 1
+        self.latency.observe(duration_ms)
+        if finished_at and (self.last_run_at is None or finished_at > self.last_run_at):
+            self.last_run_at = finished_at
 
-        started = now_iso()
+    def remove(self, status: str, duration_ms: float):
+        """Forget a run that left the retention window (always one of the oldest)."""
+        self.runs -= 1
+        if status == "success":
+            self.success -= 1
+        else:
+            self.failed -= 1
+        self.latency.discard(duration_ms)
+        if not self.runs:
+            self.last_run_at = None
 
-        # FLOW 1: Email Monitor (Folder)
-        if flow_type == "email_monitor":
-            config = flow.get("config", {})
-            folder = config.get("folder", "inbox")
-            match_from = config.get("matchFrom")
-            match_subject = config.get("matchSubject")
-
-            result = self.integrations.email_folder_monitor(folder, match_from, match_subject)
-            status = "success"
-            message = (
-                f"Email monitor checked {result['checked']} files. "
-                + (f"Matched {len(result['matches'])} email(s)." if result["found"] else "No matches found.")
-            )
+    def describe(self) -> Dict[str, Any]:
+        done = self.success + self.failed
+        return {
+            "runs": self.runs,
+            "successfulRuns": self.success,
+            "failedRuns": self.failed,
+            "successRate": f"{self.success / done * 100:.1f}" if done else "100.0",
+            "lastRunAt": self.last_run_at,
+            "latencyMs": {
+                "p50": self.latency.percentile(50),
+                "p95": self.latency.percentile(95),
+                "p99": self.latency.percentile(99),
+                "max": self.latency.max if self.latency.count else None,
+            },
+        }
+
+
+class ExecutionJournal:
+    """
+    Append-only record of every execution, in SQLite (WAL mode).
+
+    record() only updates in-memory stats and enqueues the row; a writer
+    thread commits rows in batches, so the request path never waits on
+    disk. The writer also enforces retention (max age and max rows).
+    Stats are per flow name, per flow type and overall, updated
+    incrementally and covering the retained rows: pruned rows are
+    subtracted, and on startup stats are rebuilt once from the table.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS executions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            flow TEXT NOT NULL,
+            type TEXT,
+            status TEXT NOT NULL,
+            message TEXT,
+            started_at TEXT,
+            finished_at TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            result TEXT
+        );
+        CREATE INDEX IF NOT EXISTS executions_flow ON executions (flow, id);
+        CREATE INDEX IF NOT EXISTS executions_type ON executions (type, id);
+        CREATE INDEX IF NOT EXISTS executions_finished ON executions (finished_at);
+    """
+    COLUMNS = ("id", "flow", "type", "status", "message", "started_at", "finished_at", "duration_ms", "result")
+    # Results larger than this are journaled without their payload.
+    MAX_RESULT_BYTES = 16 * 1024
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 0.5,
+                 retention_days: float = 30, max_rows: int = 100_000, queue_size: int = 10_000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self.total = FlowStats()
+        self.by_flow: Dict[str, FlowStats] = {}
+        self.by_type: Dict[str, FlowStats] = {}
+
+        conn = self._connect()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(self.SCHEMA)
+        self._load_stats(conn)
+        conn.close()
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="execution-journal", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _load_stats(self, conn: sqlite3.Connection):
+        rows = conn.execute("SELECT flow, type, status, duration_ms, finished_at FROM executions ORDER BY id")
+        for flow, flow_type, status, duration_ms, finished_at in rows:
+            self._count(flow, flow_type, status, duration_ms, finished_at)
+
+    def _count(self, flow: str, flow_type: Optional[str], status: str, duration_ms: float,
+               finished_at: Optional[str]):
+        self.total.add(status, duration_ms, finished_at)
+        self.by_flow.setdefault(flow, FlowStats()).add(status, duration_ms, finished_at)
+        self.by_type.setdefault(str(flow_type), FlowStats()).add(status, duration_ms, finished_at)
+
+    def _uncount(self, flow: str, flow_type: Optional[str], status: str, duration_ms: float):
+        self.total.remove(status, duration_ms)
+        for group, key in ((self.by_flow, flow), (self.by_type, str(flow_type))):
+            stats = group.get(key)
+            if stats is not None:
+                stats.remove(status, duration_ms)
+                if not stats.runs:
+                    del group[key]
+
+    def record(self, result: Dict[str, Any], duration_ms: float):
+        """Count an execution result and queue it for the journal; never blocks."""
+        flow = str(result.get("flow") or "Untitled Flow")
+        status = result.get("status") or ("success" if result.get("success") else "failed")
+        finished_at = result.get("finishedAt") or now_iso()
+        with self._stats_lock:
+            self._count(flow, result.get("type"), status, duration_ms, finished_at)
+
+        payload = None
+        if "result" in result:
+            payload = json.dumps(result["result"])
+            if len(payload) > self.MAX_RESULT_BYTES:
+                payload = None
+        row = (flow, result.get("type"), status, result.get("message") or result.get("error"),
+               result.get("startedAt"), finished_at, duration_ms, payload)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
             return {
-                "success": True,
-                "status": status,
-                "flow": flow_name,
-                "type": flow_type,
-                "startedAt": started,
-                "finishedAt": now_iso(),
-                "message": message,
-                "result": result,
+                "total": self.total.describe(),
+                "byFlow": {name: s.describe() for name, s in self.by_flow.items()},
+                "byType": {name: s.describe() for name, s in self.by_type.items()},
+                "dropped": self.dropped,
             }
 
-        # FLOW 2: Notification/Data Pull
-        if flow_type == "data_pull":
-            config = flow.get("config", {})
-            url = config.get("url") or "https://api.github.com/repos/nodejs/node"
-            json_path = config.get("jsonPath")
+    def history(self, limit: int = 50, flow: Optional[str] = None, flow_type: Optional[str] = None,
+                before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest-first executions, optionally filtered; `before` pages by id."""
+        self.flush()
+        clauses, params = [], []
+        if flow is not None:
+            clauses.append("flow = ?")
+            params.append(flow)
+        if flow_type is not None:
+            clauses.append("type = ?")
+            params.append(flow_type)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM executions {where} ORDER BY id DESC LIMIT ?"
+        with self._reader_lock:
+            rows = self._reader.execute(sql, (*params, max(1, min(limit, 1000)))).fetchall()
+        history = []
+        for row in rows:
+            entry = dict(zip(self.COLUMNS, row))
+            entry["result"] = json.loads(entry["result"]) if entry["result"] else None
+            history.append(entry)
+        return history
 
-            data = self.integrations.pull_notification_data(url, json_path=json_path)
-            status = "success"
-            if data.get("kind") == "json" and json_path:
-                message = f"Fetched JSON from {url}. Extracted '{json_path}' = {data.get('extracted')}"
-            else:
-                message = f"Fetched data from {url}."
+    def flush(self, timeout: float = 2.0):
+        """Wait (bounded) until rows queued so far are committed."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_prune = 0.0
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            flush_by = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    if not self._queue.qsize():
+                        break
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, flush_by - time.monotonic()))
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    conn.execute("BEGIN")
+                    conn.executemany(
+                        "INSERT INTO executions (flow, type, status, message, started_at, finished_at, "
+                        "duration_ms, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                    conn.execute("COMMIT")
+                if time.monotonic() - last_prune > 60:
+                    self._prune(conn)
+                    last_prune = time.monotonic()
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            for waiter in waiters:
+                waiter.set()
+
+    def _prune(self, conn: sqlite3.Connection):
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).isoformat() + "Z"
+        where = "WHERE finished_at < ? OR id <= (SELECT MAX(id) FROM executions) - ?"
+        conn.execute("BEGIN")
+        pruned = conn.execute(
+            f"SELECT flow, type, status, duration_ms FROM executions {where}", (cutoff, self.max_rows)
+        ).fetchall()
+        if pruned:
+            conn.execute(f"DELETE FROM executions {where}", (cutoff, self.max_rows))
+        conn.execute("COMMIT")
+        with self._stats_lock:
+            for row in pruned:
+                self._uncount(*row)
+        if pruned:
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+# ------------------------------
+# Flow Plans
+# ------------------------------
+
+# Backend flow types and the trigger node that serves each.
+FLOW_TYPE_TRIGGERS = {"email_monitor": "email", "data_pull": "web"}
+DEFAULT_PULL_URL = "https://api.github.com/repos/nodejs/node"
+EMAIL_MATCH_LIMIT = 5
+
+
+class NodeRegistry:
+    """
+    Trigger, condition and action node types by id. A node type is a
+    factory called once per compiled flow with the flow definition; the
+    node it returns does all its validation and setup up front.
+    """
+
+    KINDS = ("trigger", "condition", "action")
+
+    def __init__(self):
+        self._nodes: Dict[str, Dict[str, Any]] = {kind: {} for kind in self.KINDS}
+
+    def register(self, kind: str, node_id: str):
+        """Class decorator adding a node type under `node_id`."""
+        def decorator(factory):
+            self._nodes[kind][node_id] = factory
+            return factory
+        return decorator
+
+    def get(self, kind: str, node_id: Optional[str]):
+        return self._nodes[kind].get(node_id)
+
+    def ids(self, kind: str) -> List[str]:
+        return sorted(self._nodes[kind])
 
+
+nodes = NodeRegistry()
+
+
+class TriggerRun:
+    """What one firing of a trigger produced: lazy `events` plus counters for the report."""
+
+    __slots__ = ("events", "info")
+
+    def __init__(self, events: Iterable[Dict[str, Any]], **info: Any):
+        self.events = events
+        self.info = info
+
+
+@nodes.register("trigger", "email")
+class EmailTrigger:
+    """
+    Emails in a folder passing the from/subject rules, newest first.
+    Each email is a file; .json files look like
+      {"from": "alerts@company.com", "subject": "Server Down", "body": "..."}
+    and .txt files are a plain body. Only new or changed files are
+    parsed; see InboxIndex.
+    """
+
+    flow_type = "email_monitor"
+    limit = EMAIL_MATCH_LIMIT
+
+    def __init__(self, flow: Dict[str, Any]):
+        config = flow.get("config") or {}
+        self.folder = config.get("folder", "inbox")
+        self.match_from = config.get("matchFrom")
+        self.match_subject = config.get("matchSubject")
+        if not isinstance(self.folder, str) or not self.folder:
+            raise ValueError("Config 'folder' must be a non-empty string")
+        for key, value in (("matchFrom", self.match_from), ("matchSubject", self.match_subject)):
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"Config '{key}' must be a string")
+
+    def fire(self, integrations: "RealIntegrations", deadline: Optional[float]) -> TriggerRun:
+        os.makedirs(self.folder, exist_ok=True)
+        index = integrations.inbox_index(self.folder)
+        checked = index.refresh()
+        events = index.newest_first(self.match_from, self.match_subject)
+        return TriggerRun(events, checked=checked, index=index)
+
+    def contains(self, run: TriggerRun, event: Dict[str, Any], keyword: str) -> bool:
+        return run.info["index"].body_contains(event, keyword)
+
+    def report(self, run: TriggerRun, events: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        result = {"found": bool(events), "checked": run.info["checked"], "matches": events}
+        message = (
+            f"Email monitor checked {result['checked']} files. "
+            + (f"Matched {len(events)} email(s)." if events else "No matches found.")
+        )
+        return message, result
+
+
+@nodes.register("trigger", "web")
+class WebTrigger:
+    """One fetch of a URL; the event is the pulled data."""
+
+    flow_type = "data_pull"
+    limit = None
+
+    def __init__(self, flow: Dict[str, Any]):
+        config = flow.get("config") or {}
+        self.url = config.get("url") or DEFAULT_PULL_URL
+        self.json_path = config.get("jsonPath")
+        self.paths = compile_json_paths(self.json_path)
+
+    def fire(self, integrations: "RealIntegrations", deadline: Optional[float]) -> TriggerRun:
+        data = integrations.pull_notification_data(self.url, json_path=self.json_path, deadline=deadline)
+        return TriggerRun([data], data=data)
+
+    def contains(self, run: TriggerRun, event: Dict[str, Any], keyword: str) -> bool:
+        if event.get("kind") == "text":
+            text = event.get("preview") or ""
+        else:
+            text = json.dumps(event.get("extracted") if self.paths else event.get("data"), ensure_ascii=False)
+        return keyword in text.lower()
+
+    def report(self, run: TriggerRun, events: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        data = run.info["data"]
+        if data.get("kind") == "json" and self.paths:
+            message = f"Fetched JSON from {self.url}. Extracted '{self.paths.expr}' = {data.get('extracted')}"
+        else:
+            message = f"Fetched data from {self.url}."
+        if not events:
+            message += " Condition not met."
+        return message, data
+
+
+@nodes.register("trigger", "manual")
+class ManualTrigger:
+    """Fires a single empty event when the flow is run."""
+
+    flow_type = None
+    limit = None
+
+    def __init__(self, flow: Dict[str, Any]):
+        pass
+
+    def fire(self, integrations: "RealIntegrations", deadline: Optional[float]) -> TriggerRun:
+        return TriggerRun([{"firedAt": now_iso()}])
+
+    def contains(self, run: TriggerRun, event: Dict[str, Any], keyword: str) -> bool:
+        return False
+
+    def report(self, run: TriggerRun, events: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        return ("Manual trigger fired." if events else "Condition not met."), {"fired": bool(events)}
+
+
+@nodes.register("condition", "keyword")
+class KeywordCondition:
+    """The UI's "Contains keyword" condition, checked against each event."""
+
+    def __init__(self, flow: Dict[str, Any]):
+        keyword = (flow.get("condition") or {}).get("keyword")
+        if not isinstance(keyword, str) or not keyword.strip():
+            raise ValueError("Condition 'keyword' must be a non-empty string")
+        self.keyword = keyword.strip().lower()
+
+    def filter(self, trigger: Any, run: TriggerRun, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for event in events:
+            if trigger.contains(run, event, self.keyword):
+                yield event
+
+
+@nodes.register("action", "notify")
+class NotifyAction:
+    """Queues a notification per event; they are returned as result["notifications"]."""
+
+    def __init__(self, flow: Dict[str, Any]):
+        self.title = flow.get("name", "Untitled Flow")
+
+    def run(self, event: Dict[str, Any], outputs: Dict[str, Any]):
+        text = event.get("subject") or event.get("url") or "Flow triggered"
+        outputs.setdefault("notifications", []).append({"title": self.title, "message": text})
+
+
+@nodes.register("action", "log")
+class LogAction:
+    """Writes one line per event to the engine's stdout."""
+
+    def __init__(self, flow: Dict[str, Any]):
+        self.prefix = f"[{flow.get('name', 'Untitled Flow')}]"
+
+    def run(self, event: Dict[str, Any], outputs: Dict[str, Any]):
+        print(self.prefix, json.dumps(event, ensure_ascii=False, default=str), flush=True)
+
+
+def _node_id(value: Any) -> Optional[str]:
+    """Node ids arrive as {"id": ...} objects from the UI or as plain strings."""
+    return value.get("id") if isinstance(value, dict) else value
+
+
+def flow_type_label(flow: Dict[str, Any]) -> str:
+    """
+    Metric label for a flow's type: a known flow type or registered
+    trigger id, else "other", so client-supplied strings cannot add series.
+    """
+    flow_type = flow.get("type")
+    if isinstance(flow_type, str) and flow_type in FLOW_TYPE_TRIGGERS:
+        return flow_type
+    trigger_id = _node_id(flow.get("trigger"))
+    if isinstance(trigger_id, str) and nodes.get("trigger", trigger_id) is not None:
+        return trigger_id
+    return "other"
+
+
+class FlowPlan:
+    """
+    A compiled flow: trigger -> conditions -> actions. Events stream from
+    the trigger through each condition lazily, so a condition that rejects
+    an event stops it before any later condition or action sees it, and a
+    trigger with a `limit` is never pulled past it.
+    """
+
+    def __init__(self, flow: Dict[str, Any], registry: NodeRegistry):
+        self.name = flow.get("name", "Untitled Flow")
+        self.flow_type = flow.get("type")
+        self.trigger: Any = None
+        self.conditions: List[Any] = []
+        self.actions: List[Any] = []
+        try:
+            self._build(flow, registry)
+            self.error: Optional[str] = None
+        except ValueError as e:
+            # Invalid definitions compile to a plan that reports the problem.
+            self.trigger, self.error = None, str(e)
+
+    def _build(self, flow: Dict[str, Any], registry: NodeRegistry):
+        # Ids come from client JSON; anything but a string is simply unknown.
+        flow_type = self.flow_type if isinstance(self.flow_type, str) else None
+        trigger_id = FLOW_TYPE_TRIGGERS.get(flow_type) or _node_id(flow.get("trigger"))
+        factory = registry.get("trigger", trigger_id) if isinstance(trigger_id, str) else None
+        if factory is None:
+            raise ValueError(f"Unknown flow type: {self.flow_type}")
+        self.trigger = factory(flow)
+
+        condition = flow.get("condition")
+        if isinstance(condition, dict) and str(condition.get("keyword") or "").strip():
+            self.conditions.append(registry.get("condition", "keyword")(flow))
+        action_id = _node_id(flow.get("action"))
+        if action_id is not None:
+            factory = registry.get("action", action_id) if isinstance(action_id, str) else None
+            if factory is None:
+                raise ValueError(f"Unknown action: {action_id}")
+            self.actions.append(factory(flow))
+
+    def run(self, integrations: "RealIntegrations", deadline: Optional[float] = None,
+            fired: Optional[TriggerRun] = None) -> Dict[str, Any]:
+        """Run the plan; `fired` supplies trigger output computed elsewhere (batched scans)."""
+        started = now_iso()
+        if self.trigger is None:
             return {
-                "success": True,
-                "status": status,
-                "flow": flow_name,
-                "type": flow_type,
+                "success": False,
+                "status": "failed",
+                "flow": self.name,
+                "type": self.flow_type,
                 "startedAt": started,
                 "finishedAt": now_iso(),
-                "message": message,
-                "result": data,
+                "message": self.error,
             }
 
-        # Default / unknown
+        run = fired or self.trigger.fire(integrations, deadline)
+        events: Iterable[Dict[str, Any]] = run.events
+        for condition in self.conditions:
+            events = condition.filter(self.trigger, run, events)
+        if self.trigger.limit is not None:
+            events = itertools.islice(events, self.trigger.limit)
+
+        passed, outputs = [], {}
+        for event in events:
+            for action in self.actions:
+                action.run(event, outputs)
+            passed.append(event)
+
+        message, result = self.trigger.report(run, passed)
+        if outputs:
+            result = dict(result, **outputs)
+        return {
+            "success": True,
+            "status": "success",
+            "flow": self.name,
+            "type": self.flow_type or self.trigger.flow_type,
+            "startedAt": started,
+            "finishedAt": now_iso(),
+            "message": message,
+            "result": result,
+        }
+
+
+class FlowCompiler:
+    """
+    Compiles flow definitions into FlowPlans, keeping the most recent
+    `max_plans` keyed by a SHA-256 of the definition's canonical JSON, so
+    running the same flow again skips validation and node setup.
+    """
+
+    def __init__(self, registry: NodeRegistry, max_plans: int = 512):
+        self.registry = registry
+        self.max_plans = max_plans
+        self._plans: "OrderedDict[str, FlowPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(flow: Dict[str, Any]) -> str:
+        canonical = json.dumps(flow, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def compile(self, flow: Dict[str, Any]) -> FlowPlan:
+        key = self.digest(flow)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                metrics.inc("flow_plan_cache", result="hit")
+                return plan
+        with metrics.timer("flow_compile"):
+            plan = FlowPlan(flow, self.registry)
+        metrics.inc("flow_plan_cache", result="miss")
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+
+# ------------------------------
+# Workflow Executor
+# ------------------------------
+
+class WorkflowExecutor:
+    def __init__(self, journal: Optional[ExecutionJournal] = None):
+        self.integrations = RealIntegrations()
+        self.journal = journal
+        self.compiler = FlowCompiler(nodes, max_plans=env_int("FLOWMATE_PLAN_CACHE_SIZE", 512))
+
+    def execute(self, flow: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Execute a flow definition sent by the backend.
+        `deadline` (time.monotonic()) bounds any network I/O the flow does.
+        Every run, including ones that raise, is recorded in the journal.
+        """
+        started, started_at = time.monotonic(), now_iso()
+        try:
+            with metrics.timer("flow_execute", type=flow_type_label(flow)):
+                result = self._execute(flow, deadline)
+        except Exception as e:
+            self._record(self._failed(flow, started_at, str(e)), started)
+            raise
+        self._record(result, started)
+        return result
+
+    @staticmethod
+    def _failed(flow: Dict[str, Any], started_at: str, message: str) -> Dict[str, Any]:
         return {
             "success": False,
             "status": "failed",
-            "flow": flow_name,
-            "type": flow_type,
-            "startedAt": started,
+            "flow": flow.get("name", "Untitled Flow"),
+            "type": flow.get("type"),
+            "startedAt": started_at,
             "finishedAt": now_iso(),
-            "message": f"Unknown flow type: {flow_type}",
+            "message": message,
         }
 
+    def _record(self, result: Dict[str, Any], started: float):
+        if self.journal is not None:
+            self.journal.record(result, (time.monotonic() - started) * 1000)
+
+    def _execute(self, flow: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        return self.compiler.compile(flow).run(self.integrations, deadline)
+
+    def execute_many(self, flows: List[Dict[str, Any]], deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Execute several flows together. Email monitors on the same folder
+        share one inbox scan and one multi-rule matching pass; other flows,
+        including email monitors with a condition, run through execute().
+        Results come back in the order given. A flow (or folder group) that
+        fails gets a failed result of its own; only an overrun deadline
+        fails the whole batch.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(flows)
+        plans = [self.compiler.compile(flow) for flow in flows]
+        by_folder: Dict[str, List[int]] = {}
+        for i, plan in enumerate(plans):
+            if isinstance(plan.trigger, EmailTrigger) and not plan.conditions:
+                by_folder.setdefault(os.path.abspath(plan.trigger.folder), []).append(i)
+
+        for folder, positions in by_folder.items():
+            started, started_at = time.monotonic(), now_iso()
+            rules = [(plans[i].trigger.match_from, plans[i].trigger.match_subject) for i in positions]
+            try:
+                found_per_rule = self.integrations.email_folder_monitor_many(folder, rules)
+            except Exception as e:
+                for i in positions:
+                    results[i] = self._failed(flows[i], started_at, str(e))
+                    self._record(results[i], started)
+                continue
+            scan_seconds = time.monotonic() - started
+            for i, found in zip(positions, found_per_rule):
+                # Each flow is charged the shared scan plus its own run,
+                # not the runs of the flows before it in the group.
+                run_started = time.monotonic()
+                fired = TriggerRun(found["matches"], checked=found["checked"])
+                results[i] = plans[i].run(self.integrations, deadline, fired=fired)
+                metrics.observe("flow_execute", scan_seconds + time.monotonic() - run_started,
+                                type=flow_type_label(flows[i]))
+                self._record(results[i], run_started - scan_seconds)
+
+        for i, flow in enumerate(flows):
+            if results[i] is None:
+                try:
+                    results[i] = self.execute(flow, deadline=deadline)
+                except (TimeoutError, requests.Timeout):
+                    raise
+                except Exception as e:  # already journaled by execute()
+                    results[i] = self._failed(flow, now_iso(), str(e))
+        return results
+
+
+# ------------------------------
+# Scheduler
+# ------------------------------
+
+class CronSpec:
+    """
+    Standard 5-field cron expression (minute hour day-of-month month
+    day-of-week) in local time. Fields take *, numbers, a-b ranges, /n
+    steps and comma lists; day-of-week 0 and 7 are Sunday. When both day
+    fields are restricted, either may match (as in cron).
+    """
+
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expr}'")
+        fields = [self._parse(part, lo, hi) for part, (lo, hi) in zip(parts, self.BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self.any_day = parts[2] == "*" or parts[4] == "*"
+        self.next_after(time.time())  # rejects specs that never fire (e.g. 30 Feb)
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> FrozenSet[int]:
+        values: Set[int] = set()
+        for part in field.split(","):
+            span, _, step = part.partition("/")
+            try:
+                stride = int(step) if step else 1
+                if span == "*":
+                    start, end = lo, hi
+                elif "-" in span:
+                    start, end = (int(v) for v in span.split("-", 1))
+                else:
+                    start = int(span)
+                    end = hi if step else start
+            except ValueError:
+                raise ValueError(f"Invalid cron field '{field}'") from None
+            if stride < 1 or not lo <= start <= end <= hi:
+                raise ValueError(f"Cron field '{field}' is out of range {lo}-{hi}")
+            values.update(range(start, end + 1, stride))
+        return frozenset(values)
+
+    def _day_matches(self, dt: datetime) -> bool:
+        in_month = dt.day in self.days
+        in_week = (dt.weekday() + 1) % 7 in self.weekdays
+        return (in_month and in_week) if self.any_day else (in_month or in_week)
+
+    def next_after(self, ts: float) -> float:
+        """First matching minute strictly after the epoch time `ts`."""
+        dt = datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"Cron expression never fires: '{self.expr}'")
+
+
+def _iso_timestamp(ts: float) -> Optional[str]:
+    if not ts:
+        return None
+    try:
+        return datetime.fromtimestamp(ts).isoformat()
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+class Schedule:
+    """
+    A flow registered to run on an interval (seconds) or a cron spec.
+
+    - jitter: each run is delayed by a random 0..jitter seconds, spreading
+      flows that share a period without drifting their nominal times.
+    - max_concurrency: runs still in flight when the next one is due make
+      it skip (1 = never overlap).
+    - missed_policy: what to do when a run starts more than misfire_grace
+      seconds after its slot (a late timer or a backed-up worker pool):
+      "skip" it, or "run_once" to run a single catch-up for the newest
+      late slot. Either way the next run is the first slot after now.
+    """
+
+    MISSED_POLICIES = ("skip", "run_once")
+    MAX_SECONDS = 366 * 24 * 3600  # bound for interval, jitter, grace and timeout
+
+    def __init__(self, flow: Dict[str, Any], interval: Optional[float] = None,
+                 cron: Optional[str] = None, jitter: float = 0.0, max_concurrency: int = 1,
+                 missed_policy: str = "skip", misfire_grace: float = 5.0, timeout: float = 30.0):
+        if (interval is None) == (cron is None):
+            raise ValueError("Give exactly one of 'interval' or 'cron'")
+        if cron is not None and not isinstance(cron, str):
+            raise ValueError("'cron' must be a string")
+        seconds = {"interval": interval, "jitter": jitter, "misfireGrace": misfire_grace, "timeout": timeout}
+        for name, value in seconds.items():
+            if value is not None and not 0 <= value <= self.MAX_SECONDS:  # also rejects NaN
+                raise ValueError(f"'{name}' must be between 0 and {self.MAX_SECONDS} seconds")
+        if interval is not None and interval < 1:
+            raise ValueError("'interval' must be at least 1 second")
+        if missed_policy not in self.MISSED_POLICIES:
+            raise ValueError(f"'missedRunPolicy' must be one of {', '.join(self.MISSED_POLICIES)}")
+        if max_concurrency < 1 or timeout <= 0:
+            raise ValueError("'maxConcurrency' and 'timeout' must be positive")
+        self.id = uuid.uuid4().hex
+        self.flow = flow
+        self.interval = interval
+        self.cron = CronSpec(cron) if cron is not None else None
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.missed_policy = missed_policy
+        self.misfire_grace = misfire_grace
+        self.timeout = timeout
+        self.nominal = 0.0   # next slot, before jitter
+        self.next_run = 0.0  # when it will actually fire
+        self.running = 0
+        self.latest_due = 0.0  # slot of the most recently queued run
+        self.runs = 0
+        self.missed = 0
+        self.skipped_overlap = 0
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.cancelled = False
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "Schedule":
+        flow = payload.get("flow")
+        if not isinstance(flow, dict):
+            raise ValueError("Missing 'flow' object")
+        try:
+            return cls(
+                flow,
+                interval=float(payload["interval"]) if payload.get("interval") is not None else None,
+                cron=payload.get("cron"),
+                jitter=float(payload.get("jitter", 0)),
+                max_concurrency=int(payload.get("maxConcurrency", 1)),
+                missed_policy=payload.get("missedRunPolicy", "skip"),
+                misfire_grace=float(payload.get("misfireGrace", 5)),
+                timeout=float(payload.get("timeout", 30)),
+            )
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(str(e)) from None
+
+    def advance(self, now: float):
+        """Move nominal/next_run to the first slot after `now`."""
+        if self.cron is not None:
+            self.nominal = self.cron.next_after(max(self.nominal, now))
+        elif not self.nominal:
+            self.nominal = now + self.interval
+        else:
+            self.nominal += self.interval
+            if self.nominal <= now:
+                self.nominal += self.interval * ((now - self.nominal) // self.interval + 1)
+        self.next_run = self.nominal + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "flow": self.flow.get("name", "Untitled Flow"),
+            "type": self.flow.get("type"),
+            "interval": self.interval,
+            "cron": self.cron.expr if self.cron else None,
+            "jitter": self.jitter,
+            "maxConcurrency": self.max_concurrency,
+            "missedRunPolicy": self.missed_policy,
+            "nextRunAt": _iso_timestamp(self.next_run),
+            "running": self.running,
+            "runs": self.runs,
+            "missed": self.missed,
+            "skippedOverlap": self.skipped_overlap,
+            "lastResult": self.last_result,
+        }
+
+
+class FlowScheduler:
+    """
+    Runs registered Schedules through a WorkflowExecutor.
+
+    A single timer thread sleeps until the earliest entry of a min-heap
+    keyed by next run time, so thousands of schedules cost one wakeup per
+    due run. Cancelled or rescheduled entries are dropped lazily when they
+    reach the top. Flows run on a small thread pool, off the timer thread.
+    """
+
+    def __init__(self, executor: "WorkflowExecutor", workers: int = 4):
+        self.executor = executor
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="flow-schedule")
+        self._schedules: Dict[str, Schedule] = {}
+        self._heap: List[Tuple[float, int, Schedule]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="flow-scheduler", daemon=True)
+                self._thread.start()
+
+    def add(self, schedule: Schedule) -> Schedule:
+        self.start()
+        with self._cond:
+            schedule.advance(time.time())
+            self._schedules[schedule.id] = schedule
+            self._push(schedule)
+            self._cond.notify()
+        return schedule
+
+    def cancel(self, schedule_id: str) -> bool:
+        with self._cond:
+            schedule = self._schedules.pop(schedule_id, None)
+            if schedule is None:
+                return False
+            schedule.cancelled = True
+            return True
+
+    def get(self, schedule_id: str) -> Optional[Schedule]:
+        with self._cond:
+            return self._schedules.get(schedule_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [s.describe() for s in sorted(self._schedules.values(), key=lambda s: s.next_run)]
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def _push(self, schedule: Schedule):
+        heapq.heappush(self._heap, (schedule.next_run, next(self._seq), schedule))
+
+    def _loop(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._cond.wait(min(delay, 3600))
+                    continue
+                _due, _seq, schedule = heapq.heappop(self._heap)
+                try:
+                    self._fire(schedule, time.time())
+                except RuntimeError:  # pool shut down with the interpreter
+                    return
+                except Exception as e:
+                    # A schedule that cannot be advanced is dropped, not the timer thread.
+                    schedule.cancelled = True
+                    self._schedules.pop(schedule.id, None)
+                    schedule.last_result = {"status": "failed", "message": f"Schedule stopped: {e}",
+                                            "finishedAt": now_iso()}
+
+    def _fire(self, schedule: Schedule, now: float):
+        """Queue the due run (lateness is judged when it starts, in _run) and re-arm."""
+        if schedule.running >= schedule.max_concurrency:
+            schedule.skipped_overlap += 1
+        else:
+            self._pool.submit(self._run, schedule, schedule.next_run)
+            schedule.running += 1
+            schedule.latest_due = schedule.next_run
+        schedule.advance(now)
+        self._push(schedule)
+
+    def _run(self, schedule: Schedule, due: float):
+        started = time.monotonic()
+        try:
+            with self._cond:
+                if time.time() - due > schedule.misfire_grace:
+                    schedule.missed += 1
+                    # run_once catches up once, on the newest late slot.
+                    if schedule.missed_policy == "skip" or due != schedule.latest_due:
+                        return
+            try:
+                result = self.executor.execute(schedule.flow, deadline=started + schedule.timeout)
+            except Exception as e:
+                result = {"success": False, "status": "failed", "message": str(e)}
+            with self._cond:
+                schedule.runs += 1
+                schedule.last_result = {
+                    "status": result.get("status"),
+                    "message": result.get("message"),
+                    "finishedAt": now_iso(),
+                    "durationMs": round((time.monotonic() - started) * 1000, 1),
+                }
+        finally:
+            with self._cond:
+                schedule.running -= 1
+
 
 # ------------------------------
 # Tiny HTTP Server (no extra dependencies)
 # ------------------------------
 
 executor = WorkflowExecutor()
+watches = InboxWatchHub(executor.integrations)
+scheduler = FlowScheduler(executor, workers=env_int("FLOWMATE_SCHEDULER_WORKERS", 4))
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "content-type",
+    "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
+}
+
+# Upper bound for a single long-poll on /watch/<id>.
+MAX_WATCH_WAIT = 60
 
 
 class Handler(BaseHTTPRequestHandler):
-    def _send(self, code: int, payload: Dict[str, Any]):
-        body = json.dumps(payload).encode("utf-8")
+    # HTTP/1.1 gives keep-alive; every response carries a Content-Length.
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are dropped after this many seconds so
+    # they don't pin a worker thread.
+    timeout = env_int("FLOWMATE_KEEPALIVE_TIMEOUT", 5)
+
+    def _send(self, code: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        with metrics.timer("response_serialize"):
+            body = json.dumps(payload).encode("utf-8")
+        self._send_body(code, body, "application/json", headers)
+
+    def _send_body(self, code: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        metrics.inc("http_responses", code=str(code))
         self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Headers", "content-type")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Content-Type", content_type)
+        for key, value in CORS_HEADERS.items():
+            self.send_header(key, value)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.send_header("Content-Length", str(len(body)))
+        # Hand the worker back instead of idling on keep-alive while
+        # other connections are waiting for one.
+        if self.server.saturated():
+            self.close_connection = True
+        if self.close_connection:
+            self.send_header("Connection", "close")
         self.end_headers()
         self.wfile.write(body)
 
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
     def do_OPTIONS(self):  # noqa
         self.send_response(204)
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Headers", "content-type")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        for key, value in CORS_HEADERS.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def do_GET(self):  # noqa
-        if self.path == "/health":
+        url = urlsplit(self.path)
+        if url.path == "/health":
             return self._send(200, {"status": "OK", "service": "FlowMate Python Engine", "time": now_iso()})
+        if url.path == "/fetch/stats":
+            return self._send(200, {"success": True, "data": executor.integrations.fetcher.stats()})
+        if url.path == "/metrics":
+            body = metrics.render(self._metric_samples()).encode("utf-8")
+            return self._send_body(200, body, "text/plain; version=0.0.4; charset=utf-8")
+        if url.path == "/watch":
+            return self._send(200, {"success": True, "data": [s.describe() for s in watches.list()]})
+        if url.path == "/schedules":
+            return self._send(200, {"success": True, "data": scheduler.list()})
+        if url.path in ("/stats", "/executions"):
+            if executor.journal is None:
+                return self._send(503, {"success": False, "error": "Execution journal is disabled"})
+            if url.path == "/stats":
+                return self._send(200, {"success": True, "data": executor.journal.stats()})
+            return self._executions(parse_qs(url.query))
+        if url.path.startswith("/schedules/"):
+            schedule = scheduler.get(url.path[len("/schedules/"):])
+            if schedule is None:
+                return self._send(404, {"success": False, "error": "Schedule not found"})
+            return self._send(200, {"success": True, "data": schedule.describe()})
+        if url.path.startswith("/watch/"):
+            return self._watch_get(url.path[len("/watch/"):], parse_qs(url.query))
+        return self._send(404, {"success": False, "error": "Not found"})
+
+    def do_DELETE(self):  # noqa
+        self._read_body()
+        path = urlsplit(self.path).path
+        if path.startswith("/watch/"):
+            if watches.unsubscribe(path[len("/watch/"):]):
+                return self._send(200, {"success": True, "message": "Subscription cancelled"})
+            return self._send(404, {"success": False, "error": "Subscription not found"})
+        if path.startswith("/schedules/"):
+            if scheduler.cancel(path[len("/schedules/"):]):
+                return self._send(200, {"success": True, "message": "Schedule cancelled"})
+            return self._send(404, {"success": False, "error": "Schedule not found"})
         return self._send(404, {"success": False, "error": "Not found"})
 
     def do_POST(self):  # noqa
+        # Always drain the body so the connection stays usable for keep-alive.
+        body = self._read_body()
+        if self.path == "/execute/batch":
+            return self._execute_batch(safe_json(body))
+        if self.path == "/watch":
+            return self._watch_subscribe(safe_json(body))
+        if self.path == "/schedules":
+            return self._add_schedule(safe_json(body))
         if self.path != "/execute":
             return self._send(404, {"success": False, "error": "Not found"})
 
-        length = int(self.headers.get("Content-Length", "0"))
-        body = self.rfile.read(length)
         payload = safe_json(body)
 
         flow = payload.get("flow") if isinstance(payload, dict) else None
         if not isinstance(flow, dict):
             return self._send(400, {"success": False, "error": "Missing 'flow' object"})
 
+        deadline = time.monotonic() + self.server.request_timeout
         try:
-            result = executor.execute(flow)
+            result = executor.execute(flow, deadline=deadline)
             code = 200 if result.get("success") else 400
             return self._send(code, result)
+        except (TimeoutError, requests.Timeout) as e:
+            return self._send(504, {"success": False, "status": "failed", "error": str(e) or "Timed out"})
         except Exception as e:
             return self._send(500, {"success": False, "status": "failed", "error": str(e)})
 
+    def _execute_batch(self, payload: Dict[str, Any]):
+        flows = payload.get("flows") if isinstance(payload, dict) else None
+        if not isinstance(flows, list) or not all(isinstance(f, dict) for f in flows):
+            return self._send(400, {"success": False, "error": "Missing 'flows' array"})
+
+        deadline = time.monotonic() + self.server.request_timeout
+        try:
+            results = executor.execute_many(flows, deadline=deadline)
+            return self._send(200, {"success": True, "results": results})
+        except (TimeoutError, requests.Timeout) as e:
+            return self._send(504, {"success": False, "status": "failed", "error": str(e) or "Timed out"})
+        except Exception as e:
+            return self._send(500, {"success": False, "status": "failed", "error": str(e)})
+
+    def _metric_samples(self) -> List[Tuple[str, str, str, Dict[str, str], float]]:
+        fetch = executor.integrations.fetcher.stats()
+        samples = [
+            ("fetch_cache_total", "counter", "Shared HTTP fetch cache lookups by outcome.", {"result": key}, fetch[key])
+            for key in ("hits", "misses", "revalidated", "coalesced", "errors")
+        ]
+        samples += [
+            ("fetch_cache_entries", "gauge", "Responses held in the fetch cache.", {}, fetch["entries"]),
+            ("engine_workers", "gauge", "Worker threads serving requests.", {}, self.server.workers),
+            ("engine_queue_depth", "gauge", "Connections waiting for a worker.", {}, self.server._queue.qsize()),
+            ("watch_subscriptions", "gauge", "Open inbox watch subscriptions.", {}, len(watches.list())),
+            ("schedules", "gauge", "Registered flow schedules.", {}, len(scheduler)),
+            ("flow_plans", "gauge", "Compiled flow plans in the plan cache.", {}, len(executor.compiler)),
+        ]
+        if executor.journal is not None:
+            samples.append(("journal_dropped_total", "counter",
+                            "Executions dropped because the journal queue was full.", {}, executor.journal.dropped))
+        return samples
+
+    def _executions(self, query: Dict[str, List[str]]):
+        def arg(name: str) -> Optional[str]:
+            return query.get(name, [None])[0]
+
+        try:
+            limit = int(arg("limit") or 50)
+            before = int(arg("before")) if arg("before") else None
+        except ValueError:
+            return self._send(400, {"success": False, "error": "'limit' and 'before' must be integers"})
+        history = executor.journal.history(limit, flow=arg("flow"), flow_type=arg("type"), before=before)
+        return self._send(200, {"success": True, "data": history})
+
+    def _add_schedule(self, payload: Dict[str, Any]):
+        try:
+            schedule = Schedule.from_payload(payload if isinstance(payload, dict) else {})
+        except ValueError as e:
+            return self._send(400, {"success": False, "error": str(e)})
+        # Reject flows that cannot compile now rather than failing every run.
+        plan = executor.compiler.compile(schedule.flow)
+        if plan.error:
+            return self._send(400, {"success": False, "error": plan.error})
+        scheduler.add(schedule)
+        return self._send(201, {"success": True, "data": schedule.describe()})
+
+    def _watch_subscribe(self, payload: Dict[str, Any]):
+        flow = payload.get("flow") if isinstance(payload, dict) else None
+        plan = executor.compiler.compile(flow) if isinstance(flow, dict) else None
+        if plan is not None and plan.error:
+            return self._send(400, {"success": False, "error": plan.error})
+        if plan is None or not isinstance(plan.trigger, EmailTrigger):
+            return self._send(400, {"success": False, "error": "Missing 'flow' object of type email_monitor"})
+        trigger = plan.trigger
+        keyword = plan.conditions[0].keyword if plan.conditions else None
+        try:
+            sub = watches.subscribe(trigger.folder, trigger.match_from, trigger.match_subject, keyword)
+        except OSError as e:
+            return self._send(400, {"success": False, "error": f"Cannot watch folder '{trigger.folder}': {e.strerror or e}"})
+        except Exception as e:
+            return self._send(500, {"success": False, "error": str(e)})
+        return self._send(201, {"success": True, "data": sub.describe()})
+
+    def _watch_get(self, rest: str, query: Dict[str, List[str]]):
+        sub_id, _, tail = rest.partition("/")
+        sub = watches.get(sub_id)
+        if sub is None:
+            return self._send(404, {"success": False, "error": "Subscription not found"})
+        if tail not in ("", "events"):
+            return self._send(404, {"success": False, "error": "Not found"})
+        try:
+            wait = max(0.0, min(float(query.get("timeout", ["25"])[0]), MAX_WATCH_WAIT))
+        except ValueError:
+            wait = 25.0
+        if tail != "events" and wait == 0:
+            return self._send(200, {"success": True, "data": {"matches": sub.poll(0), "cursor": sub.cursor}})
+
+        # Waiting holds a worker, so only part of the pool may be spent on it.
+        if not self.server.watch_slots.acquire(blocking=False):
+            return self._send(
+                503,
+                {"success": False, "status": "failed", "error": "Too many open watch requests, retry shortly"},
+                headers={"Retry-After": "5"},
+            )
+        try:
+            if tail == "events":
+                return self._watch_stream(sub)
+            matches = sub.poll(wait)
+        finally:
+            self.server.watch_slots.release()
+        return self._send(200, {"success": True, "data": {"matches": matches, "cursor": sub.cursor}})
+
+    def _watch_stream(self, sub: WatchSubscription):
+        """Server-sent events: one `match` event per new email, comments as keep-alive."""
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        for key, value in CORS_HEADERS.items():
+            self.send_header(key, value)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            while not sub.closed:
+                matches = sub.poll(15)
+                for item in matches:
+                    self.wfile.write(f"id: {sub.cursor}\nevent: match\ndata: {json.dumps(item)}\n\n".encode("utf-8"))
+                if not matches:
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class OverloadedHandler(Handler):
+    """Answers every request with 503 + Retry-After and closes the connection."""
+
+    timeout = 1
+
+    def _reject(self):
+        self._read_body()
+        self.close_connection = True
+        return self._send(
+            503,
+            {"success": False, "status": "failed", "error": "Engine is busy, retry shortly"},
+            headers={"Retry-After": "1"},
+        )
+
+    do_GET = _reject
+    do_POST = _reject
+    do_DELETE = _reject
+
+
+def _overloaded_response() -> bytes:
+    body = json.dumps({"success": False, "status": "failed", "error": "Engine is busy, retry shortly"}).encode("utf-8")
+    lines = ["HTTP/1.1 503 Service Unavailable", "Content-Type: application/json"]
+    lines += [f"{key}: {value}" for key, value in CORS_HEADERS.items()]
+    lines += ["Retry-After: 1", f"Content-Length: {len(body)}", "Connection: close", "", ""]
+    return "\r\n".join(lines).encode("ascii") + body
+
+
+# Pre-rendered so the accept thread can reject a connection with one send().
+OVERLOADED_RESPONSE = _overloaded_response()
+
+
+class EngineServer(HTTPServer):
+    """
+    HTTPServer with a fixed pool of worker threads and a bounded admission
+    queue. Accepted connections wait in the queue for a worker; when the
+    queue is full (or a connection waited past the request deadline) the
+    client gets a 503 instead of piling up behind slow flows.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, handler, workers: int = 8, queue_size: int = 64,
+                 request_timeout: float = 30.0, watch_slots: Optional[int] = None):
+        super().__init__(address, handler)
+        self.workers = max(1, workers)
+        self.request_timeout = request_timeout
+        # Long-polls and event streams may hold at most this many workers.
+        self.watch_slots = threading.BoundedSemaphore(
+            max(1, watch_slots if watch_slots is not None else self.workers // 2)
+        )
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"engine-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def saturated(self) -> bool:
+        return not self._queue.empty()
+
+    def process_request(self, request, client_address):
+        try:
+            self._queue.put_nowait((request, client_address, time.monotonic()))
+        except queue.Full:
+            self._reject_now(request)
+
+    def _reject_now(self, request):
+        """
+        503 from the accept thread without waiting on the peer: the socket
+        goes non-blocking, whatever request bytes already arrived are
+        drained (so close() does not reset the connection before the reply
+        is read) and the pre-rendered response is sent in one call.
+        """
+        metrics.inc("http_responses", code="503")
+        try:
+            request.setblocking(False)
+            try:
+                request.recv(65536)
+            except OSError:
+                pass
+            request.send(OVERLOADED_RESPONSE)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address, enqueued = item
+            expired = time.monotonic() - enqueued > self.request_timeout
+            handler = OverloadedHandler if expired else self.RequestHandlerClass
+            self._finish(handler, request, client_address)
+
+    def _finish(self, handler, request, client_address):
+        try:
+            handler(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._queue.put(None)
+
 
 def main():
     port = int(os.environ.get("FLOWMATE_ENGINE_PORT", "5001"))
-    server = HTTPServer(("0.0.0.0", port), Handler)
+    journal_path = os.environ.get("FLOWMATE_JOURNAL", "flowmate_journal.db")
+    if journal_path:
+        executor.journal = ExecutionJournal(
+            journal_path,
+            retention_days=env_int("FLOWMATE_JOURNAL_RETENTION_DAYS", 30),
+            max_rows=env_int("FLOWMATE_JOURNAL_MAX_ROWS", 100_000),
+        )
+    workers = env_int("FLOWMATE_ENGINE_WORKERS", min(32, (os.cpu_count() or 1) + 4))
+    server = EngineServer(
+        ("0.0.0.0", port),
+        Handler,
+        workers=workers,
+        queue_size=env_int("FLOWMATE_ENGINE_QUEUE", 64),
+        request_timeout=env_int("FLOWMATE_REQUEST_TIMEOUT", 30),
+        watch_slots=env_int("FLOWMATE_WATCH_SLOTS", max(1, workers // 2)),
+    )
     print("=" * 60)
     print("FlowMate Python Engine (Minimal) running")
     print(f"Health:   http://localhost:{port}/health")
     print(f"Execute:  http://localhost:{port}/execute")
+    print(f"Batch:    http://localhost:{port}/execute/batch")
+    print(f"Watch:    http://localhost:{port}/watch")
+    print(f"Schedule: http://localhost:{port}/schedules")
+    print(f"Stats:    http://localhost:{port}/stats")
+    print(f"Metrics:  http://localhost:{port}/metrics")
+    print(f"Workers:  {server.workers}")
     print("Email monitor folder default: ./inbox")
     print("=" * 60)
-    server.serve_forever()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
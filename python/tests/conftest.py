@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the engine module directly from python/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
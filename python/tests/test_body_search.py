@@ -0,0 +1,53 @@
+import json
+import random
+
+from engine import EMAIL_FULL_PARSE_BYTES, JsonReader, body_contains, parse_email_file
+
+
+def chunked(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def _contains(raw_json, needle, size):
+    reader = JsonReader(chunked(raw_json, size))
+    return reader.string_contains(needle) if reader.peek() == '"' else False
+
+
+def test_streamed_search_decodes_escapes():
+    body = json.dumps("line one\nurgent \"quoted\" tab\tend é 😀 done")
+    for size in (1, 2, 3, 5, 64):
+        assert not _contains(body, "nurgent", size)
+        assert _contains(body, "\nurgent", size)
+        assert _contains(body, '"quoted"', size)
+        assert _contains(body, "é 😀 d", size)
+        assert not _contains(body, "\\n", size)
+
+
+def test_streamed_search_matches_decoded_text():
+    rng = random.Random(7)
+    alphabet = 'abAB \n\t"\\/é😀 '
+    for _ in range(400):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randrange(40)))
+        raw = json.dumps(text, ensure_ascii=rng.random() < 0.5)
+        needle = text[rng.randrange(len(text) + 1):][:rng.randrange(1, 5)].lower() or "zz"
+        for size in (1, 3, 7):
+            assert _contains(raw, needle, size) == (needle in text.lower()), (raw, needle, size)
+
+
+def test_large_and_small_json_bodies_agree(tmp_path):
+    filler = "x" * EMAIL_FULL_PARSE_BYTES
+    for name, pad in (("small.json", ""), ("large.json", filler)):
+        path = tmp_path / name
+        path.write_text(json.dumps({"from": "a@b", "subject": "s", "body": pad + "...\nurgent Café"}))
+        assert not body_contains(str(path), "nurgent"), name
+        assert body_contains(str(path), "URGENT café"), name
+        item = parse_email_file(str(path), 0)
+        assert (item["from"], item["subject"]) == ("a@b", "s")
+
+
+def test_text_preview_reads_a_bounded_prefix(tmp_path):
+    path = tmp_path / "mail.txt"
+    path.write_text("é" * 50 + "y" * 5_000_000 + "needle")
+    item = parse_email_file(str(path), 0)
+    assert item["preview"] == "é" * 50 + "y" * 70 + "..."
+    assert body_contains(str(path), "NEEDLE")
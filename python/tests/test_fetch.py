@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from engine import HttpFetcher
+
+SMALL = b'{"name": "flowmate", "stars": 5}'
+LARGE = b"x" * (256 * 1024)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves fixed bodies with an ETag and answers If-None-Match with 304."""
+
+    protocol_version = "HTTP/1.1"
+    bodies = {"/small": SMALL, "/slow": SMALL, "/large": LARGE}
+
+    def do_GET(self):
+        body = self.bodies[self.path]
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path == "/slow":
+            time.sleep(0.3)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    srv.hits = {}
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv, f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_miss_then_hit(server):
+    srv, base = server
+    fetcher = HttpFetcher(ttl=60)
+    assert fetcher.fetch(base + "/small").text() == SMALL.decode()
+    assert fetcher.fetch(base + "/small").body == SMALL
+    stats = fetcher.stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (1, 1, 1)
+    assert srv.hits["/small"] == 1
+
+
+def test_stale_entry_is_revalidated_with_etag(server):
+    srv, base = server
+    fetcher = HttpFetcher(ttl=0)
+    first = fetcher.fetch(base + "/small")
+    second = fetcher.fetch(base + "/small")
+    assert second.body == first.body
+    stats = fetcher.stats()
+    assert (stats["misses"], stats["revalidated"], stats["hits"]) == (1, 1, 0)
+    assert srv.hits["/small"] == 2
+
+
+def test_concurrent_fetches_are_coalesced(server):
+    srv, base = server
+    fetcher = HttpFetcher(ttl=60)
+    with ThreadPoolExecutor(4) as pool:
+        bodies = list(pool.map(lambda _: fetcher.fetch(base + "/slow").body, range(4)))
+    assert bodies == [SMALL] * 4
+    stats = fetcher.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 3
+    assert srv.hits["/slow"] == 1
+
+
+def test_streamed_bodies_are_not_cached(server):
+    srv, base = server
+    fetcher = HttpFetcher(ttl=60, max_entry_bytes=64 * 1024)
+    for _ in range(2):
+        resp = fetcher.fetch(base + "/large")
+        assert resp.streamed and resp.body is None
+        assert sum(len(chunk) for chunk in resp.chunks) == len(LARGE)
+        resp.close()
+    stats = fetcher.stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (2, 0, 0)
+    assert srv.hits["/large"] == 2
@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+import time
+
+import engine
+from engine import InboxIndex
+
+
+def _write(folder, name, subject, stamp):
+    path = folder / name
+    path.write_text(json.dumps({"from": "a@b", "subject": subject, "body": "b"}))
+    os.utime(path, (stamp, stamp))
+
+
+def test_refresh_parses_only_new_or_changed_files(tmp_path, monkeypatch):
+    for i in range(5):
+        _write(tmp_path, f"m{i}.json", f"s{i}", 1_700_000_000 + i)
+    (tmp_path / "notes.md").write_text("ignored")
+    parsed = []
+    real = engine.parse_email_file
+    monkeypatch.setattr(engine, "parse_email_file", lambda path, *a: parsed.append(os.path.basename(path)) or real(path, *a))
+
+    index = InboxIndex(str(tmp_path))
+    assert index.refresh() == 5
+    assert sorted(parsed) == [f"m{i}.json" for i in range(5)]
+
+    parsed.clear()
+    assert index.refresh() == 5
+    assert parsed == []
+
+    _write(tmp_path, "m1.json", "changed", 1_700_000_100)
+    os.remove(tmp_path / "m2.json")
+    assert index.refresh() == 4
+    assert parsed == ["m1.json"]
+    subjects = {item["file"]: item["subject"] for _mtime, item in index.items()}
+    assert "m2.json" not in subjects and subjects["m1.json"] == "changed"
+
+
+def test_unparseable_files_are_remembered_until_they_change(tmp_path, monkeypatch):
+    (tmp_path / "bad.json").write_text("{not json")
+    index = InboxIndex(str(tmp_path))
+    assert index.refresh() == 1
+    assert list(index.items()) == []
+    parsed = []
+    real = engine.parse_email_file
+    monkeypatch.setattr(engine, "parse_email_file", lambda path, *a: parsed.append(path) or real(path, *a))
+    index.refresh()
+    assert parsed == []
+
+
+def test_waiting_refreshes_share_a_scan(tmp_path, monkeypatch):
+    _write(tmp_path, "m.json", "s", 1_700_000_000)
+    index = InboxIndex(str(tmp_path))
+    scans = []
+    real = index._refresh
+
+    def slow_refresh():
+        scans.append(threading.current_thread().name)
+        time.sleep(0.3)
+        return real()
+
+    monkeypatch.setattr(index, "_refresh", slow_refresh)
+    first = threading.Thread(target=index.refresh, name="first")
+    first.start()
+    time.sleep(0.1)  # the first scan is under way; later callers must not reuse it
+    waiters = [threading.Thread(target=index.refresh) for _ in range(3)]
+    for t in waiters:
+        t.start()
+    for t in [first] + waiters:
+        t.join()
+    assert len(scans) == 2
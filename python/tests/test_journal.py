@@ -0,0 +1,51 @@
+import time
+
+import engine
+from engine import EngineMetrics, ExecutionJournal, FlowPlan, WorkflowExecutor, now_iso
+
+
+def _record(journal, i):
+    journal.record({
+        "flow": f"flow-{i % 3}",
+        "type": "data_pull" if i < 6 else "email_monitor",
+        "status": "success" if i % 4 else "failed",
+        "startedAt": now_iso(),
+        "finishedAt": now_iso(),
+    }, duration_ms=float(i * 10 + 1))
+
+
+def test_pruned_rows_leave_the_stats(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = ExecutionJournal(path, max_rows=5)
+    for i in range(12):
+        _record(journal, i)
+    journal.flush()
+    journal._prune(journal._connect())
+
+    stats = journal.stats()
+    assert stats["total"]["runs"] == 5 == len(journal.history(limit=100))
+    assert sorted(stats["byType"]) == ["email_monitor"]
+    rebuilt = ExecutionJournal(path, max_rows=5).stats()
+    assert {k: v for k, v in stats.items() if k != "dropped"} == {k: v for k, v in rebuilt.items() if k != "dropped"}
+
+
+def test_batched_runs_are_timed_per_flow(tmp_path, monkeypatch):
+    (tmp_path / "inbox").mkdir()
+    (tmp_path / "inbox" / "m.txt").write_text("hello")
+    executor = WorkflowExecutor()
+    durations = []
+    executor.journal = type("Journal", (), {"record": lambda self, result, ms: durations.append(ms)})()
+    monkeypatch.setattr(engine, "metrics", EngineMetrics())
+    real_run = FlowPlan.run
+
+    def slow_run(self, *args, **kwargs):
+        time.sleep(0.05)
+        return real_run(self, *args, **kwargs)
+
+    monkeypatch.setattr(FlowPlan, "run", slow_run)
+    flows = [{"name": f"f{i}", "type": "email_monitor", "config": {"folder": str(tmp_path / "inbox")}}
+             for i in range(4)]
+    executor.execute_many(flows)
+    assert len(durations) == 4
+    assert max(durations) < 90  # not cumulative (the 4th would be >= 200 ms)
+    assert engine.metrics.summary()["flow_execute[email_monitor]"]["count"] == 4
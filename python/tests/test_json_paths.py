@@ -0,0 +1,105 @@
+import json
+import random
+
+import pytest
+
+from engine import JsonReader, compile_json_paths
+
+DOC = {
+    "name": "node",
+    "owner": {"login": "nodejs", "bio": "quote \" slash \\ tab \t nl \n uni é 😀"},
+    "items": [{"id": 1, "tags": ["a", "b"]}, {"id": 2, "tags": []}, {"id": 3, "tags": ["c"]}],
+    "stats": {"stars": 5, "forks": 0.5, "open": True, "archived": False, "license": None},
+    "escaped \"key\"": "v",
+}
+
+PATHS = [
+    "name",
+    "owner.login",
+    "owner.bio",
+    "$.owner.login",
+    "items[0].id",
+    "items.1.id",
+    "items[*].id",
+    "items[*].tags[0]",
+    "stats.*",
+    "*",
+    'escaped "key"',
+    "missing",
+    "items[9].id",
+    ["name", "items[*].id", "stats.forks"],
+]
+
+
+def chunked(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+@pytest.mark.parametrize("spec", PATHS, ids=str)
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 20])
+def test_stream_matches_in_memory(spec, size):
+    paths = compile_json_paths(spec)
+    for text in (json.dumps(DOC), json.dumps(DOC, indent=2), json.dumps(DOC, ensure_ascii=False)):
+        assert paths.extract_stream(chunked(text, size)) == paths.evaluate(DOC)
+
+
+def test_negative_index_is_not_streamable():
+    assert not compile_json_paths("items[-1].id").streamable
+    assert compile_json_paths("items[-1].id").evaluate(DOC) == 3
+
+
+def test_stops_reading_once_paths_are_found():
+    consumed = []
+
+    def chunks():
+        yield '{"a": {"b": 1}, "rest": ['
+        consumed.append("rest")
+        while True:
+            yield '"filler", '
+
+    assert compile_json_paths("a.b").extract_stream(chunks()) == 1
+    assert consumed == []
+
+
+def test_wildcards_read_to_the_end():
+    text = json.dumps({"items": [{"id": i} for i in range(50)]})
+    assert compile_json_paths("items[*].id").extract_stream(chunked(text, 5)) == list(range(50))
+
+
+def test_truncated_document_raises():
+    with pytest.raises(ValueError):
+        compile_json_paths("b").extract_stream(chunked('{"a": "unterminated', 4))
+
+
+def test_reader_members_and_values():
+    reader = JsonReader(chunked('{"k": [1, "two", {"x": null}], "s": "a\\"b"}', 3))
+    seen = {}
+    for key in reader.members("{"):
+        seen[key] = reader.read_value()
+    assert seen == {"k": [1, "two", {"x": None}], "s": 'a"b'}
+
+
+def _random_value(rng, depth=0):
+    kind = rng.randrange(7 if depth < 3 else 4)
+    if kind == 0:
+        return rng.randint(-1000, 1000)
+    if kind == 1:
+        return rng.choice([True, False, None, 1.5e-3])
+    if kind in (2, 3):
+        return "".join(rng.choice('ab"\\\n\té\U0001f600 ') for _ in range(rng.randrange(12)))
+    if kind in (4, 5):
+        return {rng.choice("abcxyz"): _random_value(rng, depth + 1) for _ in range(rng.randrange(4))}
+    return [_random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+
+
+def test_random_documents_and_chunk_splits():
+    rng = random.Random(4)
+    specs = ["a", "a.b", "x[0]", "*", "a.*", "*.b", "y[*].z", ["a.c", "b"]]
+    for _ in range(500):
+        doc = {k: _random_value(rng) for k in rng.sample("abcxyz", rng.randrange(1, 6))}
+        text = json.dumps(doc, ensure_ascii=rng.random() < 0.5)
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randrange(8))))
+        parts = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        for spec in specs:
+            paths = compile_json_paths(spec)
+            assert paths.extract_stream(iter(parts)) == paths.evaluate(doc), (spec, parts)
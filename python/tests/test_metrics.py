@@ -0,0 +1,20 @@
+from engine import EngineMetrics, flow_type_label
+
+
+def test_label_values_are_escaped():
+    metrics = EngineMetrics()
+    metrics.inc("responses", code='a"b\\c\nd')
+    with metrics.timer("stage", type="x"):
+        pass
+    out = metrics.render([("gauge", "gauge", "Help.", {"name": 'q"'}, 1)])
+    assert 'flowmate_responses_total{code="a\\"b\\\\c\\nd"} 1' in out
+    assert 'flowmate_gauge{name="q\\""} 1' in out
+    assert all(line.startswith(("flowmate_", "# ")) for line in out.splitlines())
+
+
+def test_flow_type_label_is_bounded():
+    assert flow_type_label({"type": "email_monitor"}) == "email_monitor"
+    assert flow_type_label({"type": "custom", "trigger": {"id": "manual"}}) == "manual"
+    assert flow_type_label({"type": 'ev"il\n0'}) == "other"
+    assert flow_type_label({"type": "custom", "trigger": {"id": "nope"}}) == "other"
+    assert flow_type_label({"type": ["x"], "trigger": {"id": {"a": 1}}}) == "other"
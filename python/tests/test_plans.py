@@ -0,0 +1,146 @@
+import json
+import os
+
+import pytest
+
+from engine import FlowCompiler, FlowPlan, InboxIndex, NodeRegistry, TriggerRun, WorkflowExecutor, nodes
+
+
+def _registry(log):
+    """A registry whose nodes record construction and every event they see."""
+    registry = NodeRegistry()
+
+    @registry.register("trigger", "count")
+    class CountTrigger:
+        flow_type = "count"
+        limit = 2
+
+        def __init__(self, flow):
+            log.append("build")
+
+        def fire(self, integrations, deadline):
+            def events():
+                for n in range(10):
+                    log.append(("pulled", n))
+                    yield {"n": n, "text": "hit" if n % 3 == 0 else "miss"}
+            return TriggerRun(events())
+
+        def contains(self, run, event, keyword):
+            log.append(("checked", event["n"]))
+            return keyword in event["text"]
+
+        def report(self, run, events):
+            return "done", {"events": [e["n"] for e in events]}
+
+    @registry.register("condition", "keyword")
+    class Keyword:
+        def __init__(self, flow):
+            self.keyword = flow["condition"]["keyword"]
+
+        def filter(self, trigger, run, events):
+            return (e for e in events if trigger.contains(run, e, self.keyword))
+
+    @registry.register("action", "record")
+    class Record:
+        def __init__(self, flow):
+            pass
+
+        def run(self, event, outputs):
+            log.append(("acted", event["n"]))
+
+    return registry
+
+
+FLOW = {"name": "f", "trigger": {"id": "count"}, "condition": {"keyword": "hit"}, "action": "record"}
+
+
+def test_registry_lists_node_types():
+    assert nodes.ids("trigger") == ["email", "manual", "web"]
+    assert nodes.ids("condition") == ["keyword"]
+    assert nodes.ids("action") == ["log", "notify"]
+    assert nodes.get("action", "nope") is None
+
+
+def test_compiled_plans_are_cached_by_definition():
+    log = []
+    compiler = FlowCompiler(_registry(log), max_plans=2)
+    plan = compiler.compile(FLOW)
+    assert compiler.compile(json.loads(json.dumps(FLOW))) is plan
+    assert log == ["build"]  # the hit skipped node construction
+
+    compiler.compile(dict(FLOW, name="g"))
+    compiler.compile(dict(FLOW, name="h"))
+    assert len(compiler) == 2
+    assert compiler.compile(FLOW) is not plan  # evicted, least recently used
+
+
+def test_conditions_stop_events_before_actions_and_limit_stops_the_trigger():
+    log = []
+    result = FlowPlan(FLOW, _registry(log)).run(integrations=None)
+    assert result["success"] and result["result"] == {"events": [0, 3]}
+    assert log == [
+        "build",
+        ("pulled", 0), ("checked", 0), ("acted", 0),
+        ("pulled", 1), ("checked", 1),
+        ("pulled", 2), ("checked", 2),
+        ("pulled", 3), ("checked", 3), ("acted", 3),
+    ]
+
+
+@pytest.mark.parametrize("flow", [
+    {"type": ["x"]},
+    {"type": {"a": 1}},
+    {"type": "custom", "trigger": {"id": ["email"]}},
+    {"type": "custom", "trigger": {"id": "manual"}, "action": {"id": {"n": 1}}},
+])
+def test_non_string_ids_are_unknown(flow):
+    plan = FlowPlan(flow, nodes)
+    assert plan.trigger is None and plan.error.startswith("Unknown ")
+
+    result = WorkflowExecutor().execute(flow)
+    assert result["success"] is False and result["message"] == plan.error
+
+
+def test_unknown_action_fails_the_flow():
+    result = WorkflowExecutor().execute({"type": "custom", "trigger": {"id": "manual"}, "action": {"id": "nope"}})
+    assert result["success"] is False and result["message"] == "Unknown action: nope"
+
+
+def _inbox(folder, bodies):
+    for i, body in enumerate(bodies):
+        path = folder / f"m{i}.json"
+        path.write_text(json.dumps({"from": "ops@corp.io", "subject": f"alert {i}", "body": body}))
+        os.utime(path, (1_700_000_000 + i, 1_700_000_000 + i))
+
+
+def test_keyword_flows_stop_at_five_matches(tmp_path, monkeypatch):
+    _inbox(tmp_path, ["Disk FULL"] * 8 + ["fine"] * 2)
+    searched = []
+    real = InboxIndex.body_contains
+    monkeypatch.setattr(InboxIndex, "body_contains",
+                        lambda self, item, keyword: searched.append(item["file"]) or real(self, item, keyword))
+    flow = {"type": "email_monitor", "config": {"folder": str(tmp_path)}, "condition": {"keyword": "full"}}
+
+    result = WorkflowExecutor().execute(flow)["result"]
+    assert [m["file"] for m in result["matches"]] == ["m7.json", "m6.json", "m5.json", "m4.json", "m3.json"]
+    assert result["checked"] == 10
+    assert searched == ["m9.json", "m8.json", "m7.json", "m6.json", "m5.json", "m4.json", "m3.json"]
+
+
+def test_ui_flows_pick_nodes_by_id(tmp_path, capsys):
+    _inbox(tmp_path, ["x", "y"])
+    ui_flow = {"name": "ui", "type": "custom", "trigger": {"id": "email"},
+               "config": {"folder": str(tmp_path)}, "action": {"id": "notify"}}
+    result = WorkflowExecutor().execute(ui_flow)
+    assert result["success"] and result["type"] == "custom"
+    assert result["result"]["notifications"] == [
+        {"title": "ui", "message": "alert 1"},
+        {"title": "ui", "message": "alert 0"},
+    ]
+
+    typed = dict(ui_flow, type="email_monitor", trigger=None, action="log")
+    result = WorkflowExecutor().execute(typed)
+    assert result["success"] and len(result["result"]["matches"]) == 2
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line.split(" ", 1)[1])["subject"] for line in lines] == ["alert 1", "alert 0"]
+    assert all(line.startswith("[ui] ") for line in lines)
@@ -0,0 +1,146 @@
+import json
+import os
+import random
+
+import pytest
+
+from engine import AhoCorasick, InboxIndex, RuleMatcher, WorkflowExecutor
+
+
+def test_aho_corasick_matches_naive_search():
+    rng = random.Random(5)
+    for _ in range(300):
+        patterns = list({"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))})
+        automaton = AhoCorasick(patterns)
+        for _ in range(10):
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 30)))
+            assert automaton.search(text) == {i for i, p in enumerate(patterns) if p in text}
+
+
+def test_aho_corasick_overlapping_and_nested_patterns():
+    patterns = ["he", "she", "his", "hers", "e"]
+    assert AhoCorasick(patterns).search("ushers") == {0, 1, 3, 4}
+    assert AhoCorasick(patterns).search("") == set()
+
+
+SENDERS = ["alerts@ops.io", "Boss@Corp.com", "news@list.org", None]
+SUBJECTS = ["Server DOWN", "urgent: server down", "Weekly news", "hello", None]
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    rng = random.Random(6)
+    for i in range(120):
+        sender, subject = rng.choice(SENDERS), rng.choice(SUBJECTS)
+        if i % 3 == 0:
+            path = tmp_path / f"mail{i}.txt"
+            path.write_text("body")
+        else:
+            path = tmp_path / f"mail{i}.json"
+            path.write_text(json.dumps({"from": sender, "subject": subject, "body": "b"}))
+        stamp = 1_700_000_000 + rng.randint(0, 40)  # many ties on mtime
+        os.utime(path, (stamp, stamp))
+    return tmp_path
+
+
+RULES = (
+    (None, None),
+    ("alerts", None),
+    (None, "server"),
+    ("BOSS", "urgent"),
+    ("corp", "down"),
+    ("nobody", None),
+    ("", "news"),
+    ("alerts", "server"),
+)
+
+
+def _naive(index, rule, limit):
+    match_from, match_subject = (r.lower() if r else None for r in rule)
+    hits = []
+    for seq, (mtime, item) in enumerate(index.items()):
+        if match_from and item.get("from") and match_from not in str(item["from"]).lower():
+            continue
+        if match_subject and item.get("subject") and match_subject not in str(item["subject"]).lower():
+            continue
+        hits.append((mtime, -seq, item))
+    return [item for _m, _s, item in sorted(hits, reverse=True)[:limit]]
+
+
+def test_rule_matcher_matches_naive_filter(inbox):
+    index = InboxIndex(str(inbox))
+    index.refresh()
+    matcher = RuleMatcher(RULES)
+    for _ in range(2):  # second pass runs from the per-file cache
+        assert matcher.match(index, limit=5) == [_naive(index, rule, 5) for rule in RULES]
+
+
+def test_rule_matcher_sees_changed_files(inbox):
+    index = InboxIndex(str(inbox))
+    index.refresh()
+    matcher = index.matcher(RULES)
+    matcher.match(index)
+    path = inbox / "mail1.json"
+    path.write_text(json.dumps({"from": "nobody@x", "subject": "s", "body": "b"}))
+    os.utime(path, (1_800_000_000, 1_800_000_000))
+    index.refresh()
+    assert matcher.match(index)[5][0]["file"] == "mail1.json"
+
+
+def test_batched_email_flows_match_single_flow_runs(inbox):
+    executor = WorkflowExecutor()
+    flows = [
+        {"name": f"f{i}", "type": "email_monitor",
+         "config": {"folder": str(inbox), "matchFrom": rule[0], "matchSubject": rule[1]}}
+        for i, rule in enumerate(RULES)
+    ]
+    strip = lambda r: {k: v for k, v in r.items() if k not in ("startedAt", "finishedAt")}
+    single = [strip(executor.execute(flow)) for flow in flows]
+    assert [strip(r) for r in executor.execute_many(flows)] == single
+
+
+def test_batch_isolates_a_failing_folder(inbox, tmp_path_factory):
+    not_a_folder = tmp_path_factory.mktemp("other") / "file.txt"
+    not_a_folder.write_text("x")
+    executor = WorkflowExecutor()
+    journaled = []
+    executor.journal = type("Journal", (), {"record": lambda self, result, ms: journaled.append(result["flow"])})()
+    flows = [
+        {"name": "good", "type": "email_monitor", "config": {"folder": str(inbox)}},
+        {"name": "bad", "type": "email_monitor", "config": {"folder": str(not_a_folder)}},
+        {"name": "bad-keyword", "type": "email_monitor", "config": {"folder": str(not_a_folder)},
+         "condition": {"keyword": "x"}},
+    ]
+    good, bad, bad_keyword = executor.execute_many(flows)
+    assert good["success"] and good["result"]["checked"] == 120
+    assert not bad["success"] and bad["status"] == "failed" and bad["flow"] == "bad"
+    assert not bad_keyword["success"]
+    assert sorted(journaled) == ["bad", "bad-keyword", "good"]
+
+
+def test_batch_groups_equivalent_folder_paths(inbox, monkeypatch):
+    executor = WorkflowExecutor()
+    scans = []
+    real = executor.integrations.email_folder_monitor_many
+    monkeypatch.setattr(executor.integrations, "email_folder_monitor_many",
+                        lambda folder, rules: scans.append(folder) or real(folder, rules))
+    monkeypatch.chdir(inbox.parent)
+    flows = [{"name": "a", "type": "email_monitor", "config": {"folder": inbox.name}},
+             {"name": "b", "type": "email_monitor", "config": {"folder": f"./{inbox.name}/"}}]
+    executor.execute_many(flows)
+    assert scans == [str(inbox)]
+
+
+def test_email_folder_monitor_matches_the_email_trigger(inbox):
+    executor = WorkflowExecutor()
+    for rule in RULES:
+        for keyword in (None, "BODY"):
+            flow = {"type": "email_monitor",
+                    "config": {"folder": str(inbox), "matchFrom": rule[0], "matchSubject": rule[1]}}
+            if keyword:
+                flow["condition"] = {"keyword": keyword}
+            direct = executor.integrations.email_folder_monitor(str(inbox), rule[0], rule[1], keyword)
+            assert direct == executor.execute(flow)["result"]
+            assert len(direct["matches"]) <= 5
+            if keyword:
+                assert all(item["file"].endswith(".txt") for item in direct["matches"])
@@ -0,0 +1,160 @@
+import http.client
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import engine
+from engine import CronSpec, FlowScheduler, Schedule
+
+FLOW = {"name": "s", "type": "custom", "trigger": {"id": "manual"}}
+
+
+class FakeExecutor:
+    def __init__(self, gate=None):
+        self.calls = 0
+        self.gate = gate
+
+    def execute(self, flow, deadline=None):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return {"success": True, "status": "success", "message": "ok"}
+
+
+def _ts(*args):
+    return datetime(*args).timestamp()
+
+
+def test_cron_fields_parse():
+    spec = CronSpec("*/15 9-17 1,15 * 1-5")
+    assert spec.minutes == {0, 15, 30, 45}
+    assert spec.hours == set(range(9, 18))
+    assert spec.days == {1, 15}
+    assert spec.weekdays == {1, 2, 3, 4, 5}
+    assert CronSpec("0 0 * * 7").weekdays == {0}
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "a * * * *", "*/0 * * * *", "5-1 * * * *", "0 0 30 2 *"])
+def test_bad_or_never_firing_cron_is_rejected(expr):
+    with pytest.raises(ValueError):
+        CronSpec(expr)
+
+
+def test_cron_next_after():
+    assert CronSpec("*/15 * * * *").next_after(_ts(2026, 1, 1, 10, 7, 30)) == _ts(2026, 1, 1, 10, 15)
+    assert CronSpec("*/15 * * * *").next_after(_ts(2026, 1, 1, 10, 15)) == _ts(2026, 1, 1, 10, 30)
+    assert CronSpec("30 8 * 3 *").next_after(_ts(2026, 4, 1)) == _ts(2027, 3, 1, 8, 30)
+    assert CronSpec("0 0 29 2 *").next_after(_ts(2026, 1, 1)) == _ts(2028, 2, 29)
+
+
+def test_restricted_day_fields_match_either():
+    start = _ts(2026, 1, 1)  # a Thursday
+    assert CronSpec("0 0 13 * 5").next_after(start) == _ts(2026, 1, 2)  # first Friday
+    assert CronSpec("0 0 13 * *").next_after(start) == _ts(2026, 1, 13)
+    assert CronSpec("0 0 * * 5").next_after(start) == _ts(2026, 1, 2)
+    assert CronSpec("0 0 1-7 * 0").next_after(start) == _ts(2026, 1, 2)  # not only Sundays in 1-7
+
+
+def test_interval_catches_up_to_the_first_slot_after_now():
+    schedule = Schedule(FLOW, interval=10)
+    schedule.advance(1000)
+    assert schedule.nominal == schedule.next_run == 1010
+    schedule.advance(1010)
+    assert schedule.nominal == 1020
+    schedule.advance(1055)  # 1030..1050 were missed
+    assert schedule.nominal == 1060
+
+
+def test_overlapping_runs_are_skipped():
+    gate = threading.Event()
+    fake = FakeExecutor(gate)
+    scheduler = FlowScheduler(fake, workers=2)
+    schedule = Schedule(FLOW, interval=60, max_concurrency=1)
+    schedule.advance(time.time())
+    schedule.next_run = time.time()
+
+    scheduler._fire(schedule, time.time())
+    scheduler._fire(schedule, time.time())
+    assert schedule.running == 1 and schedule.skipped_overlap == 1
+
+    gate.set()
+    deadline = time.monotonic() + 5
+    while schedule.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert fake.calls == schedule.runs == 1 and schedule.running == 0
+    assert schedule.last_result["status"] == "success"
+
+
+@pytest.mark.parametrize("policy, latest, runs", [
+    ("skip", True, 0),
+    ("run_once", True, 1),
+    ("run_once", False, 0),
+])
+def test_late_runs_follow_the_missed_run_policy(policy, latest, runs):
+    fake = FakeExecutor()
+    scheduler = FlowScheduler(fake, workers=1)
+    schedule = Schedule(FLOW, interval=60, missed_policy=policy, misfire_grace=1)
+    due = time.time() - 30
+    schedule.latest_due = due if latest else due + 60
+    schedule.running = 1
+
+    scheduler._run(schedule, due)
+    assert schedule.missed == 1 and fake.calls == schedule.runs == runs
+    assert schedule.running == 0
+
+
+def test_on_time_runs_are_not_missed():
+    fake = FakeExecutor()
+    schedule = Schedule(FLOW, interval=60)
+    schedule.running = 1
+    FlowScheduler(fake, workers=1)._run(schedule, time.time())
+    assert schedule.missed == 0 and fake.calls == 1
+
+
+def test_cancelled_schedule_never_runs():
+    fake = FakeExecutor()
+    scheduler = FlowScheduler(fake, workers=1)
+    schedule = scheduler.add(Schedule(FLOW, interval=1))
+    assert len(scheduler) == 1 and scheduler.get(schedule.id) is schedule
+    assert scheduler.cancel(schedule.id)
+    assert not scheduler.cancel(schedule.id)
+    assert scheduler.get(schedule.id) is None and scheduler.list() == []
+    time.sleep(1.3)
+    assert fake.calls == 0
+
+
+@pytest.fixture
+def server():
+    srv = engine.EngineServer(("127.0.0.1", 0), engine.Handler, workers=2)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+def _post(port, path, payload):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+@pytest.mark.parametrize("flow", [
+    {"name": "s"},
+    {"type": "custom", "trigger": {"id": "manual"}, "action": {"id": "nope"}},
+    {"type": "email_monitor", "config": {"matchFrom": 5}},
+])
+def test_flows_that_cannot_compile_are_not_scheduled(server, flow):
+    status, body = _post(server, "/schedules", {"flow": flow, "interval": 1})
+    assert status == 400 and body["success"] is False and body["error"]
+    assert len(engine.scheduler) == 0
+
+
+def test_valid_schedule_is_registered(server):
+    flow = {"name": "s", "type": "custom", "trigger": {"id": "manual"}}
+    status, body = _post(server, "/schedules", {"flow": flow, "interval": 3600})
+    assert status == 201 and body["data"]["interval"] == 3600
+    assert engine.scheduler.cancel(body["data"]["id"])
@@ -0,0 +1,130 @@
+import http.client
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import engine
+
+
+class SlowHandler(engine.Handler):
+    """Engine handler with a /slow route that holds its worker."""
+
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            time.sleep(float(self.path.partition("?")[2] or 0.5))
+            return self._send(200, {"success": True})
+        return super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(**kwargs):
+        srv = engine.EngineServer(("127.0.0.1", 0), SlowHandler, **kwargs)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return srv, srv.server_address[1]
+
+    yield make
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _get(port, path, timeout=5):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    return resp, resp.read()
+
+
+def _background_get(port, path):
+    thread = threading.Thread(target=_get, args=(port, path), daemon=True)
+    thread.start()
+    return thread
+
+
+def test_full_queue_is_rejected_from_the_accept_thread(make_server):
+    srv, port = make_server(workers=1, queue_size=1)
+    _background_get(port, "/slow?1")
+    time.sleep(0.2)
+    idle = socket.create_connection(("127.0.0.1", port))  # fills the queue without sending anything
+    time.sleep(0.2)
+    started = time.monotonic()
+    resp, body = _get(port, "/health")
+    assert resp.status == 503
+    assert resp.getheader("Retry-After") == "1"
+    assert json.loads(body)["success"] is False
+    assert time.monotonic() - started < 0.5
+    idle.close()
+
+
+def test_connection_expired_in_queue_gets_503(make_server):
+    srv, port = make_server(workers=1, queue_size=4, request_timeout=0.2)
+    _background_get(port, "/slow?0.6")
+    time.sleep(0.1)
+    resp, _body = _get(port, "/health")
+    assert resp.status == 503
+    assert resp.getheader("Retry-After") == "1"
+
+
+def test_keep_alive_reuses_the_connection_until_saturated(make_server):
+    srv, port = make_server(workers=2, queue_size=4)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    for _ in range(3):
+        conn.request("GET", "/health")
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 200 and resp.getheader("Connection") != "close"
+    sock = conn.sock
+    conn.request("GET", "/health")
+    conn.getresponse().read()
+    assert conn.sock is sock
+
+    # Both workers busy and a connection waiting: the response closes.
+    _background_get(port, "/slow?0.8")
+    time.sleep(0.1)
+    waiting = socket.create_connection(("127.0.0.1", port))
+    time.sleep(0.1)
+    conn.request("GET", "/health")
+    resp = conn.getresponse()
+    resp.read()
+    assert resp.getheader("Connection") == "close"
+    waiting.close()
+
+
+class StallingUpstream(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(2)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_overrun_deadline_gives_504(make_server):
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), StallingUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    try:
+        srv, port = make_server(workers=2, request_timeout=0.3)
+        flow = {"name": "slow", "type": "data_pull",
+                "config": {"url": f"http://127.0.0.1:{upstream.server_address[1]}/stall"}}
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        started = time.monotonic()
+        conn.request("POST", "/execute", body=json.dumps({"flow": flow}))
+        resp = conn.getresponse()
+        assert resp.status == 504
+        assert json.loads(resp.read())["success"] is False
+        assert time.monotonic() - started < 1.5
+    finally:
+        upstream.shutdown()
+        upstream.server_close()
@@ -0,0 +1,151 @@
+import http.client
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import engine
+from engine import InboxIndex, InboxWatchHub, InboxWatcher, RealIntegrations
+
+
+@pytest.fixture
+def server():
+    srv = engine.EngineServer(("127.0.0.1", 0), engine.Handler, workers=2)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+def _subscribe(port, flow):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("POST", "/watch", body=json.dumps({"flow": flow}), headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+@pytest.mark.parametrize("config", [
+    {"matchFrom": 5},
+    {"matchSubject": ["x"]},
+    {"folder": 3},
+    "file",
+])
+def test_bad_subscriptions_get_400(server, tmp_path, config):
+    if config == "file":
+        (tmp_path / "inbox").write_text("not a folder")
+        config = {"folder": str(tmp_path / "inbox")}
+    else:
+        config = {"folder": str(tmp_path / "inbox"), **config}
+    status, body = _subscribe(server, {"type": "email_monitor", "config": config})
+    assert status == 400 and body["success"] is False and body["error"]
+    assert engine.watches.list() == []
+
+
+def test_failed_start_closes_the_inotify_fd(tmp_path, monkeypatch):
+    closed = []
+
+    class Source:
+        def __init__(self, folder):
+            pass
+
+        def close(self):
+            closed.append(True)
+
+    def boom(self):
+        raise OSError("scan failed")
+
+    monkeypatch.setattr(engine, "_Inotify", Source)
+    monkeypatch.setattr(InboxIndex, "refresh", boom)
+    with pytest.raises(OSError):
+        InboxWatcher(InboxIndex(str(tmp_path))).start()
+    assert closed == [True]
+
+
+def _mail(folder, name, sender="ops@corp.io", subject="Server down", body="disk full", age=10.0):
+    path = folder / name
+    path.write_text(json.dumps({"from": sender, "subject": subject, "body": body}))
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+@pytest.fixture
+def hub():
+    hub = InboxWatchHub(RealIntegrations(), settle=0.05, poll_interval=0.05)
+    yield hub
+    for sub in hub.list():
+        hub.unsubscribe(sub.id)
+
+
+def test_new_mail_is_delivered_once(hub, tmp_path):
+    _mail(tmp_path, "old.json", subject="already here")
+    sub = hub.subscribe(str(tmp_path))
+    _mail(tmp_path, "new.json")
+
+    matches = sub.poll(5)
+    assert [m["subject"] for m in matches] == ["Server down"]
+    assert sub.cursor == sub.watcher.seq == 1
+    assert sub.poll(0.3) == []
+
+
+def test_unsettled_files_are_held_back(tmp_path):
+    watcher = InboxWatcher(InboxIndex(str(tmp_path)), settle=60)
+    path = _mail(tmp_path, "m.json", age=0)
+    watcher._scan()
+    assert watcher.seq == 0 and watcher._unsettled
+
+    stamp = time.time() - 120
+    os.utime(path, (stamp, stamp))
+    watcher._scan()
+    assert watcher.seq == 1 and not watcher._unsettled
+
+
+def test_rules_and_keyword_filter_each_subscription(hub, tmp_path):
+    every = hub.subscribe(str(tmp_path))
+    boss = hub.subscribe(str(tmp_path), match_from="BOSS")
+    disk = hub.subscribe(str(tmp_path), keyword="disk")
+    _mail(tmp_path, "a.json", sender="boss@corp.io", subject="Lunch", body="lunch?")
+    _mail(tmp_path, "b.json", body="Disk full on db1", age=5)
+
+    assert len(every.poll(5)) >= 1
+    deadline = time.monotonic() + 5
+    while every.watcher.seq < 2 and time.monotonic() < deadline:
+        every.poll(0.2)
+    assert every.watcher.seq == 2
+    assert [m["from"] for m in boss.poll(0)] == ["boss@corp.io"]
+    assert [m["subject"] for m in disk.poll(0)] == ["Server down"]
+    assert boss.cursor == disk.cursor == 2
+
+
+def test_unsubscribe_wakes_a_blocked_poll(hub, tmp_path):
+    sub = hub.subscribe(str(tmp_path))
+    result = []
+    thread = threading.Thread(target=lambda: result.append(sub.poll(30)))
+    thread.start()
+    time.sleep(0.1)
+    assert hub.unsubscribe(sub.id)
+    thread.join(2)
+    assert not thread.is_alive() and result == [[]]
+    assert sub.watcher.stopped
+
+
+def test_idle_subscriptions_are_reaped(tmp_path):
+    hub = InboxWatchHub(RealIntegrations(), settle=0.05, poll_interval=0.05, idle_ttl=0.2)
+    sub = hub.subscribe(str(tmp_path))
+    deadline = time.monotonic() + 5
+    while hub.list() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert hub.list() == [] and sub.closed and sub.watcher.stopped
+
+
+def test_polling_fallback_without_inotify(hub, tmp_path, monkeypatch):
+    def unavailable(folder):
+        raise OSError("no inotify")
+
+    monkeypatch.setattr(engine, "_Inotify", unavailable)
+    sub = hub.subscribe(str(tmp_path))
+    assert sub.describe()["mode"] == "polling"
+    _mail(tmp_path, "m.json")
+    assert [m["subject"] for m in sub.poll(5)] == ["Server down"]